@@ -0,0 +1,55 @@
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import calculator
+from calculator import calculate_expression
+
+EXPRESSIONS = [
+    "7",
+    "2+3",
+    "12.5*4-3/2",
+    "1+2*3-4/5+6*7-8/9+10",
+    "+".join(str(i) for i in range(1, 101)),
+]
+
+
+def eval_expression(expression):
+    # The evaluation path used before the compiled engine
+    try:
+        return eval(expression)
+    except ZeroDivisionError:
+        raise ValueError("Błąd: Dzielenie przez zero.")
+    except SyntaxError:
+        raise ValueError("Błąd: Błędna składnia wyrażenia.")
+    except Exception as e:
+        raise ValueError("Błąd: " + str(e))
+
+
+def calculate_cold(expression):
+    # Every call misses the compile cache
+    calculator._compile_raw.cache_clear()
+    calculator.compile_expression.cache_clear()
+    return calculate_expression(expression)
+
+
+def bench(function, expression, number):
+    return min(timeit.repeat(lambda: function(expression), number=number, repeat=5)) / number
+
+
+def main():
+    number = 20000
+    print("%-28s %12s %12s %12s %8s" % ("wyrażenie", "eval [us]", "cold [us]", "engine [us]", "x"))
+    for expression in EXPRESSIONS:
+        eval_time = bench(eval_expression, expression, number)
+        cold_time = bench(calculate_cold, expression, number)
+        engine_time = bench(calculate_expression, expression, number)
+        label = expression if len(expression) <= 28 else expression[:25] + "..."
+        print("%-28s %12.2f %12.2f %12.2f %8.1f" % (
+            label, eval_time * 1e6, cold_time * 1e6, engine_time * 1e6, eval_time / engine_time))
+
+
+if __name__ == "__main__":
+    main()
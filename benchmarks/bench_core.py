@@ -0,0 +1,73 @@
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calculator_core import CalculatorCore, HistoryModel
+
+PRESSES = 200000
+# Key presses between two frames when typing quickly
+PRESSES_PER_FRAME = 4
+
+
+class CountingView:
+    # Stands in for a window: counts what it would have drawn
+    def __init__(self):
+        self.draws = 0
+
+    def show_expression(self, expression, cursor):
+        self.draws += 1
+
+    def show_preview(self, preview):
+        self.draws += 1
+
+    def show_pending(self):
+        self.draws += 1
+
+    def show_result(self, result):
+        self.draws += 1
+
+    def show_error(self, error):
+        self.draws += 1
+
+
+def run(result_as_operand):
+    # No GTK: results are delivered at once and frames are ticked by hand
+    random.seed(1)
+    labels = [random.choice("0123456789+-*/") for _ in range(PRESSES)]
+    # No '**': a random power tower would take the worker ages
+    for index in range(1, PRESSES):
+        if labels[index] == labels[index - 1] == "*":
+            labels[index] = "1"
+    for index in range(29, PRESSES, 30):
+        labels[index] = "="
+    # Now and then clear, so that a result kept as the operand does not grow forever
+    for index in range(149, PRESSES, 150):
+        labels[index] = "C"
+    frames = []
+    view = CountingView()
+    core = CalculatorCore(HistoryModel())
+    session = core.new_session(view, lambda function, *args: function(*args), frames.append, result_as_operand)
+
+    start = time.perf_counter()
+    for index, label in enumerate(labels):
+        session.press(label)
+        if index % PRESSES_PER_FRAME == 0:
+            while frames:
+                frames.pop()()
+    elapsed = time.perf_counter() - start
+    core.close()
+    return elapsed / PRESSES, view.draws, len(core.history.history_of_calculations)
+
+
+def main():
+    print("%22s %14s %12s %10s" % ("sesja", "klawisz [us]", "rysowania", "historia"))
+    for name, result_as_operand in (("nowe wyrażenie po =", False), ("wynik jako argument", True)):
+        per_press, draws, history = run(result_as_operand)
+        print("%22s %14.2f %12d %10d" % (name, per_press * 1e6, draws, history))
+
+
+if __name__ == "__main__":
+    main()
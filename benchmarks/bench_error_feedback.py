@@ -0,0 +1,121 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calculator_core import CalculatorCore, HistoryModel
+
+# A burst of invalid expressions, typed and sent with '=' back to back
+INVALID = ("1/0", "7+", "2*3-", "5/0+1", "9-9/0", "4*", "8/0-1")
+BURST = 2000
+
+
+class FakeButton:
+    def __init__(self, label):
+        self.label = label
+
+    def get_label(self):
+        return self.label
+
+
+class FeedbackView:
+    # Records when each error reaches the view
+    def __init__(self):
+        self.errors = []
+
+    def show_expression(self, expression, cursor):
+        pass
+
+    def show_preview(self, preview):
+        pass
+
+    def show_pending(self):
+        pass
+
+    def show_result(self, result):
+        pass
+
+    def show_error(self, error):
+        self.errors.append((time.perf_counter(), error.code))
+
+
+def burst_labels():
+    labels = []
+    for index in range(BURST):
+        labels += list(INVALID[index % len(INVALID)]) + ["="]
+    return labels
+
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    return (latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)], latencies[-1])
+
+
+def run_headless():
+    # No GTK: results are delivered at once, frames ticked after every key
+    view = FeedbackView()
+    frames = []
+    core = CalculatorCore(HistoryModel())
+    session = core.new_session(view, lambda function, *args: function(*args), frames.append)
+    latencies = []
+    for label in burst_labels():
+        start = time.perf_counter()
+        session.press(label)
+        while frames:
+            frames.pop()()
+        if label == "=":
+            latencies.append(view.errors[-1][0] - start)
+    core.close()
+    return percentiles(latencies), len(view.errors)
+
+
+def run_gtk():
+    # Requires a display; run under Xvfb or GDK_BACKEND=broadway when headless
+    from calculator_gui import CalculatorWindow, Gtk
+    from calculator_gtk import HistoryBox
+
+    if not Gtk.init_check(None)[0]:
+        raise RuntimeError("brak ekranu")
+    window = CalculatorWindow(None, CalculatorCore(HistoryBox()))
+    window.show_all()
+    errors = []
+    show_error = window.show_error
+
+    def record_error(error):
+        show_error(error)
+        errors.append(time.perf_counter())
+
+    # The session finds the instance attribute before the method
+    window.show_error = record_error
+    latencies = []
+    stalls = []
+    for label in burst_labels():
+        start = time.perf_counter()
+        shown = len(errors)
+        window.on_button_clicked(FakeButton(label))
+        while Gtk.events_pending():
+            iteration = time.perf_counter()
+            Gtk.main_iteration()
+            stalls.append(time.perf_counter() - iteration)
+        if label == "=" and len(errors) > shown:
+            latencies.append(errors[-1] - start)
+    window.on_window_destroy(window)
+    return percentiles(latencies), len(latencies), max(stalls)
+
+
+def main():
+    print("%10s %10s %10s %10s %10s" % ("", "błędy", "p50 [us]", "p99 [us]", "max [us]"))
+    (p50, p99, worst), count = run_headless()
+    print("%10s %10d %10.1f %10.1f %10.1f" % ("sesja", count, p50 * 1e6, p99 * 1e6, worst * 1e6))
+    try:
+        (p50, p99, worst), count, stall = run_gtk()
+    except (ImportError, ValueError, RuntimeError) as e:
+        print("pominięto okno GTK: %s" % e, file=sys.stderr)
+        return
+    print("%10s %10d %10.1f %10.1f %10.1f" % ("okno", count, p50 * 1e6, p99 * 1e6, worst * 1e6))
+    print("najdłuższa iteracja pętli głównej: %.2f ms" % (stall * 1e3))
+
+
+if __name__ == "__main__":
+    main()
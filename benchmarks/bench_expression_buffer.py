@@ -0,0 +1,121 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calculator_core import CalculatorCore, HistoryModel
+
+TOKENS = "1+2*3-4/5+"
+LENGTHS = (10 ** 3, 10 ** 4, 10 ** 5)
+KEYS = 200
+
+
+class DrawingView:
+    # Counts the characters it is given to draw
+    def __init__(self):
+        self.drawn = 0
+
+    def show_expression(self, expression, cursor):
+        self.drawn += len(expression)
+
+    def show_preview(self, preview):
+        pass
+
+    def show_pending(self):
+        pass
+
+    def show_result(self, result):
+        pass
+
+    def show_error(self, error):
+        pass
+
+
+class StringExpression:
+    # The expression as one string, as the session kept it before
+    def __init__(self, text):
+        self.expression = text
+
+    def type_key(self, char):
+        self.expression += char
+
+    def backspace(self):
+        self.expression = self.expression[:-1]
+
+
+def timed_keys(function):
+    # Microseconds per call, over KEYS calls, of the main thread's time: long
+    # previews are evaluated by the scheduler's worker meanwhile
+    start = time.thread_time()
+    for index in range(KEYS):
+        function(index)
+    return (time.thread_time() - start) / KEYS * 1e6
+
+
+def run(length):
+    text = (TOKENS * (length // len(TOKENS) + 1))[:length]
+    view = DrawingView()
+    frames = []
+    core = CalculatorCore(HistoryModel())
+    session = core.new_session(view, lambda function, *args: function(*args), frames.append)
+    session.type_text(text)
+
+    def tick():
+        while frames:
+            frames.pop()()
+
+    def type_and_delete(index):
+        # A digit typed and removed, each followed by a frame
+        session.press("7")
+        tick()
+        session.press("←")
+        tick()
+
+    times = {}
+    times["koniec"] = timed_keys(type_and_delete)
+    drawn = view.drawn / (2 * KEYS)
+
+    session.cursor_home()
+    for _ in range(length // 2):
+        session.cursor_right()
+    tick()
+    times["środek"] = timed_keys(type_and_delete)
+
+    session.cursor_end()
+    tick()
+
+    def undo_and_redo(index):
+        session.undo()
+        tick()
+        session.redo()
+        tick()
+
+    times["cofnij"] = timed_keys(undo_and_redo)
+    core.close()
+
+    string = StringExpression(text)
+
+    def string_type_and_delete(index):
+        string.type_key("7")
+        len(string.expression)
+        string.backspace()
+        len(string.expression)
+
+    times["napis"] = timed_keys(string_type_and_delete)
+    return times, drawn
+
+
+def main():
+    # Per digit typed and removed (or change undone and redone), with a frame after each;
+    # "napis" is the same on one string, which was also drawn whole
+    print("%10s %12s %12s %12s %12s %10s" % ("znaki", "koniec [us]", "środek [us]", "cofnij [us]",
+                                             "napis [us]", "rysowane"))
+    for length in LENGTHS:
+        times, drawn = run(length)
+        print("%10d %12.1f %12.1f %12.1f %12.1f %10d" % (length, times["koniec"], times["środek"], times["cofnij"],
+                                                         times["napis"], drawn))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calculator_core import HistoryModel
+from history_export import HistoryImport, export_history, import_history, read_columns
+from history_store import HistoryStore
+
+SIZES = (100000, 1000000)
+
+
+def filled_store(size):
+    random.seed(1)
+    store = HistoryStore(size)
+    for index in range(size):
+        left, right = random.randint(1, 99999), random.randint(1, 999)
+        store.append("%d*%d" % (left, right), left * right, 1.7e9 + index)
+    return store
+
+
+def measure(function):
+    # Seconds and peak memory allocated by Python while `function` runs
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    print("%10s %8s %12s %12s %12s %12s" % ("wpisy", "format", "eksport [s]", "pamięć [MB]",
+                                            "plik [MB]", "import [s]"))
+    for size in SIZES:
+        store = filled_store(size)
+        for name in ("historia.csv", "historia.col"):
+            path = os.path.join(directory, name)
+            export_time, export_peak, _ = measure(lambda: export_history(store, path))
+            file_size = os.path.getsize(path)
+            # Into a history of the default capacity, as the GUI imports
+            history = HistoryModel()
+            start = time.perf_counter()
+            HistoryImport(history, import_history(path, history.capacity)).run()
+            import_time = time.perf_counter() - start
+            print("%10d %8s %12.2f %12.1f %12.1f %12.2f" % (size, name.rsplit(".", 1)[1], export_time,
+                                                            export_peak / 2 ** 20, file_size / 2 ** 20, import_time))
+        try:
+            start = time.perf_counter()
+            columns = read_columns(os.path.join(directory, "historia.col"))
+            total = columns["value"].sum()
+            print("%10d %8s  mapowanie i suma wyników: %.1f ms (%g)" % (size, "numpy", (time.perf_counter() - start) * 1e3,
+                                                                          total))
+            del columns
+        except ImportError as e:
+            print("pominięto numpy: %s" % e, file=sys.stderr)
+        for name in ("historia.csv", "historia.col"):
+            os.remove(os.path.join(directory, name))
+    os.rmdir(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calculator_core import SEARCH_LIMIT, HistoryModel
+
+ENTRIES = 1000000
+QUERIES = (
+    "7",
+    "+1",
+    "99",
+    "123",
+    "4*56",
+    "999/1",
+    "12345+",
+    "=500",
+    ">999000",
+    "<=-0.5",
+    "100..101",
+    "0..1000000",
+)
+
+
+def fill(history):
+    random.seed(1)
+    store = history.history_of_calculations
+    for _ in range(ENTRIES):
+        left, right = random.randint(1, 99999), random.randint(1, 999)
+        operator = random.choice("+-*/")
+        expression = "%d%s%d" % (left, operator, right)
+        store.append(expression, eval(expression))
+
+
+def first_matches(history, query):
+    # Time to the first screen of matches, as HistoryWindow shows them
+    start = time.perf_counter()
+    found = 0
+    for entry in history.iter_matches(query):
+        if entry is not None:
+            found += 1
+            if found >= SEARCH_LIMIT:
+                break
+    return time.perf_counter() - start, found
+
+
+def main():
+    history = HistoryModel(capacity=ENTRIES)
+    start = time.perf_counter()
+    fill(history)
+    print("wypełnienie %d wpisów: %.2f s" % (ENTRIES, time.perf_counter() - start))
+    print("%14s %12s %10s" % ("zapytanie", "czas [ms]", "wyniki"))
+    for query in QUERIES:
+        elapsed, found = first_matches(history, query)
+        print("%14s %12.2f %10d" % (query, elapsed * 1e3, found))
+
+
+if __name__ == "__main__":
+    main()
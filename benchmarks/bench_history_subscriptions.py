@@ -0,0 +1,110 @@
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from calculator_core import HistoryModel
+
+WINDOWS = 1000
+CHECKPOINT = 100
+ADDS = 1000
+CAPACITY = 1000
+# Growth from the first to the last checkpoint above which the check fails
+MEMORY_SLACK = 256 * 1024
+TIME_SLACK = 2.0
+
+
+class HeadlessHistoryWindow:
+    # Stands in for HistoryWindow: subscribes on open and does the same
+    # work per update, without a display
+    def __init__(self, history):
+        self.history = history
+        self.lines = history.get_history()
+        self.subscription = history.subscribe(self.on_history_updated)
+
+    def on_history_updated(self, action, added, removed):
+        self.lines = self.history.get_history()
+
+    def destroy(self):
+        self.subscription.cancel()
+
+
+def headless_windows(history):
+    # Half the windows unsubscribe on destroy, the other half are just dropped
+    for index in range(WINDOWS):
+        window = HeadlessHistoryWindow(history)
+        if index % 2:
+            window.destroy()
+        yield
+
+
+def gtk_windows(history):
+    from calculator_gui import Gtk, HistoryWindow
+    for _ in range(WINDOWS):
+        window = HistoryWindow(None, history)
+        window.show_all()
+        window.destroy()
+        while Gtk.events_pending():
+            Gtk.main_iteration()
+        yield
+
+
+def add_cost(history):
+    start = time.perf_counter()
+    for index in range(ADDS):
+        history.add_to_history(f"{index}+1", index + 1)
+    return (time.perf_counter() - start) / ADDS
+
+
+def run(name, history, windows):
+    for index in range(CAPACITY):
+        history.add_to_history(f"{index}+1", index + 1)
+    print(name)
+    print("%8s %12s %14s %12s" % ("okna", "pamięć [kB]", "dodanie [us]", "subskrypcje"))
+    checkpoints = []
+    tracemalloc.start()
+    for opened, _ in enumerate(windows, 1):
+        if opened % CHECKPOINT == 0:
+            gc.collect()
+            cost = add_cost(history)
+            memory = tracemalloc.get_traced_memory()[0]
+            checkpoints.append((memory, cost))
+            print("%8d %12.1f %14.2f %12d" % (opened, memory / 1024, cost * 1e6, len(history.subscribers)))
+    tracemalloc.stop()
+
+    (first_memory, first_cost), (last_memory, last_cost) = checkpoints[0], checkpoints[-1]
+    failures = []
+    if history.subscribers.describe():
+        failures.append("live subscribers: %s" % ", ".join(history.subscribers.describe()))
+    if last_memory - first_memory > MEMORY_SLACK:
+        failures.append("memory grew by %.1f kB" % ((last_memory - first_memory) / 1024))
+    if last_cost > first_cost * TIME_SLACK:
+        failures.append("add_to_history slowed down %.1fx" % (last_cost / first_cost))
+    return failures
+
+
+def main():
+    history = HistoryModel(capacity=CAPACITY)
+    failures = run("okna bez GTK", history, headless_windows(history))
+    try:
+        from calculator_gui import Gtk
+        from calculator_gtk import HistoryBox
+    except (ImportError, ValueError) as e:
+        print("pominięto okna GTK: %s" % e, file=sys.stderr)
+    else:
+        # Requires a display; run under Xvfb or GDK_BACKEND=broadway when headless
+        if Gtk.init_check(None)[0]:
+            history = HistoryBox(capacity=CAPACITY)
+            failures += run("okna GTK", history, gtk_windows(history))
+        else:
+            print("pominięto okna GTK: brak ekranu", file=sys.stderr)
+    if failures:
+        sys.exit("\n".join(failures))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from calculator_gui import Gtk, HistoryWindow
+from calculator_gtk import HistoryBox
+
+ENTRIES = 100000
+STEP = 10000
+
+
+def process_events():
+    while Gtk.events_pending():
+        Gtk.main_iteration()
+
+
+def main():
+    # Requires a display; run under Xvfb or GDK_BACKEND=broadway when headless
+    history_box = HistoryBox(capacity=ENTRIES)
+    window = HistoryWindow(None, history_box)
+    window.show_all()
+    process_events()
+
+    print("%10s %18s %18s" % ("wpisy", "delta [us/wpis]", "pełne [us/wpis]"))
+    for count in range(STEP, ENTRIES + 1, STEP):
+        start = time.perf_counter()
+        for index in range(count - STEP, count):
+            history_box.add_to_history(f"{index}+1", index + 1)
+        process_events()
+        delta_time = (time.perf_counter() - start) / STEP
+
+        # The previous behaviour: rebuilding the whole buffer on every update
+        start = time.perf_counter()
+        for _ in range(10):
+            window.update_history_list()
+        process_events()
+        full_time = (time.perf_counter() - start) / 10
+
+        print("%10d %18.1f %18.1f" % (count, delta_time * 1e6, full_time * 1e6))
+
+    window.destroy()
+
+
+if __name__ == "__main__":
+    main()
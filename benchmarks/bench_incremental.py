@@ -0,0 +1,60 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calculator import IncrementalEvaluator
+
+TOKENS = ['7', '+', '3', '*', '2', '-', '8', '/', '4']
+# Growth of the per-keystroke cost from 10^3 to 10^5 tokens above which the check fails
+TIME_SLACK = 3.0
+# Each cost is the best of this many runs, so that a stray pause does not fail the check
+REPEATS = 3
+
+
+def keystroke_cost(evaluator, keys):
+    start = time.perf_counter()
+    for key in keys:
+        evaluator.push(key)
+        evaluator.preview
+    return (time.perf_counter() - start) / len(keys)
+
+
+def backspace_cost(evaluator, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        evaluator.pop()
+        evaluator.preview
+    return (time.perf_counter() - start) / count
+
+
+def main():
+    # Per-keystroke cost measured at growing expression lengths, up to 10^5
+    # tokens; fails if it does not stay flat
+    sample = TOKENS * 200
+    evaluator = IncrementalEvaluator()
+    length = 0
+    costs = []
+    print("%12s %16s %16s" % ("tokeny", "klawisz [us]", "← [us]"))
+    for target in (10 ** 3, 10 ** 4, 10 ** 5):
+        while length < target:
+            evaluator.push(TOKENS[length % len(TOKENS)])
+            length += 1
+        push_time = pop_time = float("inf")
+        for _ in range(REPEATS):
+            push_time = min(push_time, keystroke_cost(evaluator, sample))
+            pop_time = min(pop_time, backspace_cost(evaluator, len(sample)))
+        costs.append((push_time, pop_time))
+        print("%12d %16.2f %16.2f" % (length, push_time * 1e6, pop_time * 1e6))
+
+    failures = []
+    for name, first, last in zip(("push", "pop"), costs[0], costs[-1]):
+        if last > first * TIME_SLACK:
+            failures.append("%s slowed down %.1fx from 10^3 to 10^5 tokens" % (name, last / first))
+    if failures:
+        sys.exit("\n".join(failures))
+
+
+if __name__ == "__main__":
+    main()
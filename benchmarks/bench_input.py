@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from calculator_core import CalculatorCore
+from calculator_gui import CalculatorWindow, Gtk
+from calculator_gtk import HistoryBox
+
+TOKENS = "1+2*3-4/5+"
+
+
+def process_events():
+    while Gtk.events_pending():
+        Gtk.main_iteration()
+
+
+def main():
+    # Requires a display; run under Xvfb or GDK_BACKEND=broadway when headless
+    window = CalculatorWindow(None, CalculatorCore(HistoryBox()))
+    window.show_all()
+    process_events()
+    session = window.session
+    redraws = []
+    redraw = session.redraw
+    session.input_pipeline.redraw = lambda: redraws.append(None) or redraw()
+
+    print("%10s %16s %12s %16s" % ("znaki", "sposób", "rysowania", "czas [ms]"))
+    for length in (10 ** 3, 10 ** 4, 10 ** 5):
+        text = (TOKENS * (length // len(TOKENS) + 1))[:length]
+        for name in ("klawisze", "wklejenie"):
+            session.press('C')
+            process_events()
+            del redraws[:]
+            start = time.perf_counter()
+            if name == "klawisze":
+                # A burst of key presses arriving between two frames
+                for char in text:
+                    session.press(char)
+            else:
+                window.on_clipboard_text(None, text)
+            # Lets the frame clock tick until the display has caught up
+            while session.input_pipeline._dirty:
+                Gtk.main_iteration()
+            elapsed = time.perf_counter() - start
+            print("%10d %16s %12d %16.1f" % (length, name, len(redraws), elapsed * 1e3))
+    window.on_window_destroy(window)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import os
+import resource
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from calculator_gui import CalculatorApplication, Gtk
+
+ACTIVATIONS = 100
+
+
+def resident_memory_kb():
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * resource.getpagesize() // 1024
+
+
+def wait_until_visible(window):
+    while not window.get_mapped() or Gtk.events_pending():
+        Gtk.main_iteration()
+
+
+def main():
+    # Requires a display; run under Xvfb or GDK_BACKEND=broadway when headless
+    app = CalculatorApplication()
+    app.register(None)
+    app.activate()
+    wait_until_visible(app.windows["calculator"])
+    memory_before = resident_memory_kb()
+
+    names = ["history", "about", "calculator"]
+    timings = {name: [] for name in names}
+    for index in range(ACTIVATIONS):
+        name = names[index % len(names)]
+        start = time.perf_counter()
+        app.activate_action(name, None)
+        # Every calculator activation opens another calculator window
+        window = app.calculators[-1] if name == "calculator" else app.windows[name]
+        wait_until_visible(window)
+        timings[name].append(time.perf_counter() - start)
+        # Closing hides history and about, so the next activation presents
+        # them again, and destroys the extra calculator
+        window.close()
+
+    print("%12s %16s %16s" % ("okno", "pierwsze [ms]", "kolejne [ms]"))
+    for name in names:
+        first, *rest = timings[name]
+        print("%12s %16.2f %16.2f" % (name, first * 1e3, sum(rest) / len(rest) * 1e3))
+    print("RSS: %d kB przed, %d kB po %d aktywacjach" % (memory_before, resident_memory_kb(), ACTIVATIONS))
+    app.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calculator import MODES, IncrementalEvaluator, calculate_expression
+
+REPEATS = 200
+EXPRESSIONS = {
+    "całkowite": "+".join("%d*%d-%d" % (i, i + 1, i // 2) for i in range(1, 200)),
+    "ułamki": "+".join("0.%d*%d-1/%d" % (i, i + 1, i) for i in range(1, 200)),
+    "potęgi": "+".join("2**%d" % i for i in range(1, 200)),
+}
+
+
+def evaluation_cost(expression, mode):
+    calculate_expression(expression, mode)  # compile once, then time the cached path
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        calculate_expression(expression, mode)
+    return (time.perf_counter() - start) / REPEATS
+
+
+def typing_cost(expression, mode):
+    start = time.perf_counter()
+    evaluator = IncrementalEvaluator(mode=mode)
+    for char in expression:
+        evaluator.push(char)
+        evaluator.preview
+    return (time.perf_counter() - start) / len(expression)
+
+
+def main():
+    # The integer row shows the fast path: exact modes run the plain integer code
+    print("%12s %10s %18s %18s" % ("wyrażenie", "tryb", "obliczenie [us]", "klawisz [us]"))
+    for name, expression in EXPRESSIONS.items():
+        for mode in MODES:
+            print("%12s %10s %18.2f %18.2f" % (name, mode, evaluation_cost(expression, mode) * 1e6,
+                                                typing_cost(expression, mode) * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from calculator_core import CalculatorCore
+from calculator_gui import CalculatorWindow, Gtk
+from calculator_gtk import HistoryBox
+
+# Takes a few seconds to evaluate
+EXPRESSION = "7**7**8"
+DURATION = 3.0
+
+
+class FakeButton:
+    def __init__(self, label):
+        self.label = label
+
+    def get_label(self):
+        return self.label
+
+
+def main():
+    # Requires a display; run under Xvfb or GDK_BACKEND=broadway when headless
+    window = CalculatorWindow(None, CalculatorCore(HistoryBox()))
+    window.show_all()
+    frame_times = []
+    window.add_tick_callback(lambda widget, clock: frame_times.append(clock.get_frame_time()) or True)
+
+    for label in EXPRESSION + "=":
+        window.on_button_clicked(FakeButton(label))
+
+    end = time.perf_counter() + DURATION
+    while time.perf_counter() < end:
+        Gtk.main_iteration_do(False)
+        # A queued redraw keeps the frame clock ticking
+        window.queue_draw()
+
+    gaps = sorted((b - a) / 1000 for a, b in zip(frame_times, frame_times[1:]))
+    if not gaps:
+        sys.exit("no frames were drawn")
+    p99 = gaps[min(len(gaps) - 1, int(len(gaps) * 0.99))]
+    print("klatki: %d w %.1f s, p99 odstępu: %.1f ms, maks.: %.1f ms" % (len(frame_times), DURATION, p99, gaps[-1]))
+    print("wynik w toku:", window.result_entry.get_text())
+    window.destroy()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from evaluation_scheduler import EvaluationScheduler
+from result_cache import ResultCache
+
+CALCULATIONS = 100000
+DISTINCT = 2000
+
+
+def workload():
+    # Operators come back to a small set of calculations, typed with varying spacing
+    random.seed(1)
+    expressions = ["+".join("%d*%d" % (i + j, j + 1) for j in range(20)) for i in range(DISTINCT)]
+    return [random.choice(expressions).replace("+", random.choice(("+", " + "))) for _ in range(CALCULATIONS)]
+
+
+def run(expressions, cache):
+    scheduler = EvaluationScheduler(lambda *args: None, cache=cache)
+    start = time.perf_counter()
+    for expression in expressions:
+        scheduler.submit(expression, lambda value, error: None)
+    return (time.perf_counter() - start) / len(expressions)
+
+
+def main():
+    expressions = workload()
+    print("%16s %14s %10s %10s %10s" % ("pamięć", "obliczenie [us]", "trafienia", "chybienia", "usunięcia"))
+    print("%16s %14.2f" % ("brak", run(expressions, None) * 1e6))
+    for size in (DISTINCT // 4, DISTINCT):
+        cache = ResultCache(size)
+        elapsed = run(expressions, cache)
+        print("%16d %14.2f %10d %10d %10d" % (size, elapsed * 1e6, cache.hits, cache.misses, cache.evictions))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history_log import HistoryLog
+from history_store import HistoryEntry
+from result_format import describe_result, exact_text, format_result, parse_int
+
+DIGITS = (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6)
+# Repeats of the fast, bounded calls
+REPEATS = 200
+
+
+def timed(function, repeats=1):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats
+
+
+def timed_str(value):
+    # None past Python's limit on int/str conversion
+    try:
+        return timed(lambda: str(value))
+    except ValueError:
+        return None
+
+
+def log_round_trip(value):
+    # Appending the result to the log and reading it back
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "historia.log")
+        start = time.perf_counter()
+        log = HistoryLog(path)
+        log.append(HistoryEntry("x", value, 0.0))
+        log.close()
+        log = HistoryLog(path)
+        entries, _ = log.read_last(1)
+        log.close()
+        elapsed = time.perf_counter() - start
+    assert entries[-1].result == value
+    return elapsed
+
+
+def run(digits):
+    value = 7 ** int(digits / 0.845098)
+    times = {}
+    times["wyświetlanie"] = timed(lambda: (format_result(value), describe_result(value)), REPEATS)
+    times["str"] = timed_str(value)
+    times["dokładnie"] = timed(lambda: exact_text(value))
+    text = exact_text(value)
+    times["odczyt"] = timed(lambda: parse_int(text))
+    times["dziennik"] = log_round_trip(value)
+    return times
+
+
+def main():
+    # "wyświetlanie" is what the window does for every result; "dokładnie" and
+    # "odczyt" are done only on copying, export and in the log
+    print("%10s %18s %10s %15s %12s %14s" % ("cyfry", "wyświetlanie [us]", "str [ms]", "dokładnie [ms]",
+                                             "odczyt [ms]", "dziennik [ms]"))
+    for digits in DIGITS:
+        times = run(digits)
+        plain = "limit" if times["str"] is None else "%.2f" % (times["str"] * 1e3)
+        print("%10d %18.1f %10s %15.2f %12.2f %14.2f" % (digits, times["wyświetlanie"] * 1e6, plain,
+                                                         times["dokładnie"] * 1e3, times["odczyt"] * 1e3,
+                                                         times["dziennik"] * 1e3))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import deque
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SEED = 184589
+EXPRESSIONS = 20000
+DISTINCT = 1000
+# (connections, requests in flight per connection, expressions per frame)
+SCENARIOS = (
+    (1, 1, 1),
+    (1, 64, 1),
+    (8, 64, 1),
+    (32, 16, 1),
+    (1, 8, 100),
+    (8, 8, 100),
+)
+
+
+def workload():
+    rng = random.Random(SEED)
+    expressions = []
+    for _ in range(DISTINCT):
+        parts = [str(rng.randint(1, 999))]
+        for _ in range(rng.randint(1, 20)):
+            parts.append(rng.choice("+-*/"))
+            parts.append(str(rng.randint(0, 999)))
+        expressions.append("".join(parts))
+    return [rng.choice(expressions) for _ in range(EXPRESSIONS)]
+
+
+async def client(path, frames, depth, latencies):
+    # Keeps up to `depth` frames in flight; answers come back in order
+    reader, writer = await asyncio.open_unix_connection(path, limit=2 ** 24)
+    in_flight = asyncio.Semaphore(depth)
+    sent = deque()
+
+    async def receive():
+        for _ in frames:
+            line = await reader.readline()
+            if not line:
+                raise ConnectionError("service closed the connection")
+            latencies.append(time.perf_counter() - sent.popleft())
+            in_flight.release()
+
+    receiver = asyncio.create_task(receive())
+    for frame in frames:
+        await in_flight.acquire()
+        sent.append(time.perf_counter())
+        writer.write(frame)
+        if in_flight.locked():
+            await writer.drain()
+    await receiver
+    writer.close()
+
+
+def encode_frames(expressions, batch):
+    frames = []
+    for index in range(0, len(expressions), batch):
+        chunk = expressions[index:index + batch]
+        request = {"id": index, "batch": chunk} if batch > 1 else {"id": index, "expression": chunk[0]}
+        frames.append((json.dumps(request) + "\n").encode("utf-8"))
+    return frames
+
+
+async def run_scenario(path, expressions, connections, depth, batch):
+    share = len(expressions) // connections
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        client(path, encode_frames(expressions[index * share:(index + 1) * share], batch), depth, latencies)
+        for index in range(connections)
+    ))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return (share * connections / elapsed, latencies[len(latencies) // 2],
+            latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))])
+
+
+def wait_for_socket(path, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit("service exited with code %d" % process.returncode)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(path)
+                return
+            except OSError:
+                time.sleep(0.05)
+    sys.exit("service did not start within %d s" % timeout)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generator obciążenia usługi obliczeń (evaluation_service).")
+    parser.add_argument("--socket", help="gniazdo działającej usługi; domyślnie uruchamiana jest własna, bez historii na dysku")
+    args = parser.parse_args(argv)
+
+    process = None
+    path = args.socket
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), "calculator.sock")
+        process = subprocess.Popen([sys.executable, os.path.join(ROOT, "evaluation_service.py"),
+                                    "--socket", path])
+        wait_for_socket(path, process)
+    try:
+        expressions = workload()
+        print("%10s %10s %8s %14s %10s %10s" % ("połączenia", "w locie", "ramka", "wyrażenia/s", "p50 [ms]", "p99 [ms]"))
+        for connections, depth, batch in SCENARIOS:
+            throughput, p50, p99 = asyncio.run(run_scenario(path, expressions, connections, depth, batch))
+            print("%10d %10d %8d %14.0f %10.3f %10.3f" % (connections, depth, batch, throughput, p50 * 1e3, p99 * 1e3))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
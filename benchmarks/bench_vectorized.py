@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from calculator import calculate_expression, evaluate_vectorized
+
+EXPRESSION = "a*b+c"
+
+
+def loop_rows(a, b, c):
+    # One calculate_expression call per row, as the GUI path would do it
+    results = []
+    for row in zip(a.tolist(), b.tolist(), c.tolist()):
+        try:
+            results.append(calculate_expression("%r*%r+%r" % row))
+        except ValueError:
+            results.append(None)
+    return results
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print("%10s %16s %16s %10s" % ("wiersze", "pętla [ns/w]", "numpy [ns/w]", "x"))
+    for rows in (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6):
+        a, b, c = (rng.integers(-1000, 1000, rows) for _ in range(3))
+
+        loop_rows_count = min(rows, 10 ** 4)
+        start = time.perf_counter()
+        loop_rows(a[:loop_rows_count], b[:loop_rows_count], c[:loop_rows_count])
+        loop_time = (time.perf_counter() - start) / loop_rows_count
+
+        start = time.perf_counter()
+        evaluate_vectorized(EXPRESSION, a=a, b=b, c=c)
+        vector_time = (time.perf_counter() - start) / rows
+
+        print("%10d %16.1f %16.1f %10.0f" % (rows, loop_time * 1e9, vector_time * 1e9, loop_time / vector_time))
+
+
+if __name__ == "__main__":
+    main()
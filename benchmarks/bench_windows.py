@@ -0,0 +1,50 @@
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from calculator_core import CalculatorCore
+from calculator_gui import AboutWindow, CalculatorWindow, Gtk, HistoryWindow
+from calculator_gtk import HistoryBox
+from style_manager import StyleManager
+
+WINDOWS = 200
+
+
+def main():
+    # Requires a display; run under Xvfb or GDK_BACKEND=broadway when headless
+    history_box = HistoryBox()
+    core = CalculatorCore(history_box)
+    window_classes = [
+        lambda: CalculatorWindow(None, core),
+        lambda: HistoryWindow(None, history_box),
+        lambda: AboutWindow(None),
+    ]
+
+    windows = []
+    timings = []
+    for index in range(WINDOWS):
+        start = time.perf_counter()
+        window = window_classes[index % len(window_classes)]()
+        window.show_all()
+        while Gtk.events_pending():
+            Gtk.main_iteration()
+        timings.append(time.perf_counter() - start)
+        windows.append(window)
+
+    registrations = StyleManager.get_default().registrations
+    print("okna: %d, zarejestrowani dostawcy CSS: %d" % (len(windows), registrations))
+    print("pierwsze 10 okien: %.2f ms/okno" % (sum(timings[:10]) / 10 * 1e3))
+    print("ostatnie 10 okien: %.2f ms/okno" % (sum(timings[-10:]) / 10 * 1e3))
+
+    for window in windows:
+        window.destroy()
+
+    if registrations != 1:
+        sys.exit("styles.css registered %d times" % registrations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import calculator
+
+SEED = 184589
+REPEATS = 5
+# At most this many expressions per case (within the compile cache), with
+# about this many operands in total
+ENGINE_EXPRESSIONS = 1000
+ENGINE_OPERANDS = 100000
+ENGINE_LENGTHS = (1, 10, 100, 1000)
+ERROR_RATES = (0.0, 0.1, 0.5)
+HISTORY_SIZES = (1000, 10000, 100000)
+GUI_CLICKS = 2000
+# A benchmark slower than the baseline by more than this is reported as a regression
+REGRESSION_THRESHOLD = 0.10
+
+
+class FakeButton:
+    def __init__(self, label):
+        self.label = label
+
+    def get_label(self):
+        return self.label
+
+
+def timings(function, repeats=REPEATS):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return {"min": min(samples), "median": statistics.median(samples)}
+
+
+def result(part, name, params, operations, samples):
+    # Times are per operation, in seconds
+    return {
+        "part": part,
+        "name": name,
+        "params": params,
+        "min": samples["min"] / operations,
+        "median": samples["median"] / operations,
+        "throughput": operations / samples["median"],
+    }
+
+
+def expression_of_length(rng, operands):
+    parts = [str(rng.randint(1, 999))]
+    for _ in range(operands - 1):
+        parts.append(rng.choice("+-*/"))
+        parts.append(str(rng.randint(1, 999)))
+    return "".join(parts)
+
+
+def engine_expressions(length, error_rate):
+    # Errors are split between division by zero and bad syntax
+    rng = random.Random(SEED + length)
+    expressions = []
+    for _ in range(min(ENGINE_EXPRESSIONS, ENGINE_OPERANDS // length)):
+        expression = expression_of_length(rng, length)
+        if rng.random() < error_rate:
+            expression += rng.choice(("/0", "+"))
+        expressions.append(expression)
+    return expressions
+
+
+def run_engine():
+    results = []
+    for length in ENGINE_LENGTHS:
+        for error_rate in ERROR_RATES:
+            expressions = engine_expressions(length, error_rate)
+
+            def evaluate_all():
+                for expression in expressions:
+                    try:
+                        calculator.calculate_expression(expression)
+                    except ValueError:
+                        pass
+
+            def evaluate_cold():
+                calculator._compile_raw.cache_clear()
+                calculator.compile_expression.cache_clear()
+                evaluate_all()
+
+            params = {"operands": length, "error_rate": error_rate}
+            results.append(result("engine", "calculate_expression.cold", params, len(expressions),
+                                  timings(evaluate_cold)))
+            results.append(result("engine", "calculate_expression.cached", params, len(expressions),
+                                  timings(evaluate_all)))
+    return results
+
+
+def process_events(Gtk):
+    while Gtk.events_pending():
+        Gtk.main_iteration()
+
+
+def run_history():
+    from calculator_gui import Gtk, HistoryWindow
+    from calculator_gtk import HistoryBox
+    results = []
+    for size in HISTORY_SIZES:
+        def fill():
+            history_box = HistoryBox(capacity=size)
+            for index in range(size):
+                history_box.add_to_history(f"{index}+1", index + 1)
+            return history_box
+
+        results.append(result("history", "HistoryBox.add_to_history", {"entries": size}, size,
+                              timings(fill, repeats=3)))
+
+        if not Gtk.init_check(None)[0]:
+            continue
+        history_box = fill()
+        window = HistoryWindow(None, history_box)
+        window.show_all()
+        process_events(Gtk)
+
+        def update():
+            window.update_history_list()
+            process_events(Gtk)
+
+        results.append(result("history", "HistoryWindow.update_history_list", {"entries": size}, 1,
+                              timings(update, repeats=3)))
+        window.destroy()
+    return results
+
+
+def run_gui():
+    from calculator_core import CalculatorCore
+    from calculator_gui import CalculatorWindow, Gtk
+    from calculator_gtk import HistoryBox
+    if not Gtk.init_check(None)[0]:
+        raise RuntimeError("no display; run under Xvfb or GDK_BACKEND=broadway")
+    rng = random.Random(SEED)
+    labels = [rng.choice("0123456789+-*/") for _ in range(GUI_CLICKS)]
+    # '=' every twenty clicks, so expressions stay short and some end in errors
+    for index in range(19, GUI_CLICKS, 20):
+        labels[index] = "="
+    buttons = [FakeButton(label) for label in labels]
+
+    window = CalculatorWindow(None, CalculatorCore(HistoryBox()))
+    window.show_all()
+    process_events(Gtk)
+
+    def click_all():
+        for button in buttons:
+            window.on_button_clicked(button)
+            process_events(Gtk)
+
+    results = [result("gui", "CalculatorWindow.on_button_clicked", {"clicks": GUI_CLICKS}, GUI_CLICKS,
+                      timings(click_all, repeats=3))]
+    window.on_window_destroy(window)
+    return results
+
+
+PARTS = {
+    "engine": run_engine,
+    "history": run_history,
+    "gui": run_gui,
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def result_key(entry):
+    return entry["part"], entry["name"], json.dumps(entry["params"], sort_keys=True)
+
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    # Prints the median change per benchmark; returns the number of regressions
+    previous = {result_key(entry): entry for entry in baseline["results"]}
+    regressions = 0
+    for entry in current["results"]:
+        old = previous.get(result_key(entry))
+        if old is None:
+            continue
+        change = entry["median"] / old["median"] - 1
+        regressed = change > threshold
+        regressions += regressed
+        print("%-8s %-40s %-40s %+7.1f%%%s" % (entry["part"], entry["name"], json.dumps(entry["params"]),
+                                               change * 100, "  REGRESJA" if regressed else ""))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Zestaw benchmarków kalkulatora z wynikami w JSON.")
+    parser.add_argument("--output", "-o", default="-", help="plik JSON z wynikami lub '-' dla stdout")
+    parser.add_argument("--parts", default=",".join(PARTS), help="części do uruchomienia: " + ", ".join(PARTS))
+    parser.add_argument("--compare", metavar="BASELINE", help="plik JSON z poprzedniego uruchomienia")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="względne spowolnienie mediany uznawane za regresję")
+    args = parser.parse_args(argv)
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": SEED,
+        "results": [],
+        "skipped": {},
+    }
+    for part in args.parts.split(","):
+        try:
+            report["results"] += PARTS[part]()
+        except (ImportError, ValueError, RuntimeError) as e:
+            # The history and GUI parts need PyGObject, the GUI part a display as well
+            report["skipped"][part] = str(e)
+            print("pominięto %s: %s" % (part, e), file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            return 1 if compare(json.load(baseline), report, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
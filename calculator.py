@@ -1,10 +1,871 @@
-def calculate_expression(expression):
+import operator
+import os
+import re
+import sys
+from collections import deque, namedtuple
+from contextlib import nullcontext
+from decimal import Decimal, DecimalException, localcontext
+from fractions import Fraction
+from functools import lru_cache, reduce
+from itertools import islice
+
+from metrics import timed
+
+# Number literals (also the "1e+20" form produced by str(float)), operators,
+# variable names of the vectorized mode, and any other single character so
+# that the parser can reject it
+_NUMBER_RE = re.compile(r"\d+\.?\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?")
+# Incomplete number literals that can still become valid: ".", "1e", "1.5e-"
+_NUMBER_PREFIX_RE = re.compile(r"\.|\d+\.?\d*[eE][+-]?|\.\d+[eE][+-]?")
+_TOKEN_RE = re.compile(r"\d+\.?\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?|\*\*|//|[-+*/]|[A-Za-z_]\w*|\S")
+# An exponent of 10000 or more: the rational mode turns 1e99999 into an
+# exact integer, which takes seconds once the exponent has seven digits
+_LARGE_EXPONENT_RE = re.compile(r"[eE][+-]?0*[1-9]\d{4}")
+
+
+def _floor_divide(left, right):
+    # Decimal's // truncates toward zero; it floors here, like int, float
+    # and Fraction, so that -7.0//2 is -4 in every mode
+    if type(left) is Decimal or type(right) is Decimal:
+        quotient, remainder = divmod(left, right)
+        if remainder and (remainder < 0) != (right < 0):
+            quotient -= 1
+        return quotient
+    return left // right
+
+
+_BINARY_OPERATORS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.truediv,
+    '//': _floor_divide,
+    '**': operator.pow,
+}
+
+_UNARY_OPERATORS = {
+    '+': operator.pos,
+    '-': operator.neg,
+}
+
+ZERO_DIVISION_ERROR = "Błąd: Dzielenie przez zero."
+SYNTAX_ERROR = "Błąd: Błędna składnia wyrażenia."
+
+# Opcodes of the compiled form
+CONST = 0
+UNARY = 1
+BINARY = 2
+VARIABLE = 3
+
+DECIMAL_ERROR = "Błąd: Niedozwolona operacja dziesiętna."
+OVERFLOW_ERROR = "Błąd: Wynik poza zakresem."
+COMPILE_CACHE_SIZE = 1024
+# Parse states computed at a time after an edit far back in a long expression
+CATCH_UP_LIMIT = 256
+
+# Codes of CalculationError, for callers that react to the kind of failure
+# rather than show the message
+ZERO_DIVISION = "zero-division"
+SYNTAX = "syntax"
+DECIMAL_OPERATION = "decimal-operation"
+OVERFLOW = "overflow"
+INTERRUPTED = "interrupted"
+OTHER = "other"
+
+# Arithmetic modes: binary floats as in Python, or exact decimal / rational numbers
+FLOAT = "float"
+DECIMAL = "decimal"
+FRACTION = "fraction"
+MODES = (FLOAT, DECIMAL, FRACTION)
+DECIMAL_PRECISION = 50
+
+
+def tokenize(expression):
+    return _TOKEN_RE.findall(expression)
+
+
+def normalize_expression(expression):
+    # "2+3" and "2 + 3" share one entry in the result cache
+    return " ".join(tokenize(expression))
+
+
+def _parse_number(token):
+    if token.isdigit():
+        return int(token)
+    return float(token)
+
+
+_NUMBER_PARSERS = {
+    FLOAT: _parse_number,
+    DECIMAL: Decimal,
+    FRACTION: Fraction,
+}
+
+
+def _mode_context(mode):
+    if mode == DECIMAL:
+        return localcontext(prec=DECIMAL_PRECISION)
+    return nullcontext()
+
+
+def _demote(value):
+    # 6/3 in the rational mode is shown as 2, not 2/1
+    if type(value) is Fraction and value.denominator == 1:
+        return value.numerator
+    return value
+
+
+class _Parser:
+    # Recursive descent over Python's precedence rules for + - * / // **,
+    # emitting postfix code: a tuple of (opcode, argument) pairs. Takes the
+    # tokens of tokenize() as they are: a token is a number if it starts
+    # with a digit, or with a '.' followed by more.
+
+    def __init__(self, tokens, allow_variables=False, parse_number=_parse_number):
+        # None marks the end, so that looking ahead needs no bounds check
+        self.tokens = list(tokens)
+        self.tokens.append(None)
+        self.allow_variables = allow_variables
+        self.parse_number = parse_number
+        self.position = 0
+        self.code = []
+
+    def peek(self):
+        return self.tokens[self.position]
+
+    def next(self):
+        token = self.tokens[self.position]
+        if token is None:
+            raise SyntaxError("unexpected end of expression")
+        self.position += 1
+        return token
+
+    def parse(self):
+        self.parse_sum()
+        if self.peek() is not None:
+            raise SyntaxError("unexpected token %r" % self.peek())
+        return tuple(self.code)
+
+    def parse_sum(self):
+        tokens = self.tokens
+        self.parse_product()
+        while tokens[self.position] in ('+', '-'):
+            op = tokens[self.position]
+            self.position += 1
+            self.parse_product()
+            self.code.append((BINARY, _BINARY_OPERATORS[op]))
+
+    def parse_product(self):
+        tokens = self.tokens
+        self.parse_unary()
+        while tokens[self.position] in ('*', '/', '//'):
+            op = tokens[self.position]
+            self.position += 1
+            self.parse_unary()
+            self.code.append((BINARY, _BINARY_OPERATORS[op]))
+
+    def parse_unary(self):
+        position = self.position
+        token = self.tokens[position]
+        if token is not None and self.tokens[position + 1] != '**' and _is_number_token(token):
+            # The common case, a number on its own
+            self.position = position + 1
+            self.code.append((CONST, self.parse_number(token)))
+        elif token in ('+', '-'):
+            self.position = position + 1
+            self.parse_unary()
+            self.code.append((UNARY, _UNARY_OPERATORS[token]))
+        else:
+            self.parse_power()
+
+    def parse_power(self):
+        self.parse_operand()
+        if self.peek() == '**':
+            self.next()
+            self.parse_unary()
+            self.code.append((BINARY, operator.pow))
+
+    def parse_operand(self):
+        token = self.next()
+        if _is_number_token(token):
+            self.code.append((CONST, self.parse_number(token)))
+        elif self.allow_variables and token.isidentifier():
+            self.code.append((VARIABLE, token))
+        else:
+            raise SyntaxError("unexpected token %r" % token)
+
+
+def _is_number_token(token):
+    return token[0].isdecimal() or token[0] == '.' and len(token) > 1
+
+
+@lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def compile_expression(tokens, mode=FLOAT):
+    # `tokens` is a tuple from tokenize(); "2+3" and "2 + 3" share one entry
+    return _Parser(tokens, parse_number=_NUMBER_PARSERS[mode]).parse()
+
+
+def _is_integer_code(code):
+    # Integer operands without '/' give an exact result in every mode,
+    # unless a negative exponent turns up (checked on the result)
+    return all(type(argument) is int for opcode, argument in code if opcode == CONST) \
+        and all(argument is not operator.truediv for opcode, argument in code if opcode == BINARY)
+
+
+def is_slow_expression(expression, mode=FLOAT):
+    # Whether the expression may take long enough to stall the caller: it
+    # has '**', or a number with a large exponent in the rational mode
+    return "**" in expression or mode == FRACTION and _LARGE_EXPONENT_RE.search(expression) is not None
+
+
+def is_integer_expression(expression):
+    # True when the expression has the same integer-or-error value in every mode
+    code, error = _compile_raw(expression)
+    return error is None and _is_integer_code(code)
+
+
+@lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def _compile_raw(expression, mode=FLOAT):
+    # Fast path for strings seen verbatim before, skipping the tokenizer.
+    # Compile errors are cached as well, so that bad input is rejected
+    # without raising again. The exact modes get a pair: the plain integer
+    # code when it is provably exact (else None) and the exact code.
     try:
-        result = eval(expression)
+        tokens = tuple(tokenize(expression))
+        code = compile_expression(tokens)
+        if mode == FLOAT:
+            return code, None
+        return (code if _is_integer_code(code) else None, compile_expression(tokens, mode)), None
+    except Exception as e:
+        return None, (error_message(e), error_code(e))
+
+
+def execute(code):
+    if len(code) == 1:
+        return code[0][1]
+    stack = []
+    push = stack.append
+    pop = stack.pop
+    for opcode, argument in code:
+        if opcode == CONST:
+            push(argument)
+        elif opcode == BINARY:
+            right = pop()
+            push(argument(pop(), right))
+        else:
+            push(argument(pop()))
+    return stack[0]
+
+
+class CalculationError(ValueError):
+    # Raised by calculate_expression: str() is the message for the user,
+    # `code` the kind of failure
+    def __init__(self, message, code=OTHER):
+        super().__init__(message, code)
+        self.code = code
+
+    def __str__(self):
+        return self.args[0]
+
+
+def error_code(error):
+    if isinstance(error, ZeroDivisionError):
+        return ZERO_DIVISION
+    if isinstance(error, DecimalException):
+        return ZERO_DIVISION if error_message(error) == ZERO_DIVISION_ERROR else DECIMAL_OPERATION
+    if isinstance(error, SyntaxError):
+        return SYNTAX
+    if isinstance(error, OverflowError):
+        return OVERFLOW
+    return OTHER
+
+
+def error_message(error):
+    if isinstance(error, ZeroDivisionError):
+        return ZERO_DIVISION_ERROR
+    if isinstance(error, DecimalException):
+        # The C implementation raises e.g. InvalidOperation([DivisionUndefined])
+        signals = error.args[0] if error.args and isinstance(error.args[0], list) else [type(error)]
+        if any(issubclass(signal, ZeroDivisionError) for signal in signals):
+            return ZERO_DIVISION_ERROR
+        return DECIMAL_ERROR
+    if isinstance(error, SyntaxError):
+        return SYNTAX_ERROR
+    if isinstance(error, OverflowError):
+        return OVERFLOW_ERROR
+    return "Błąd: " + str(error)
+
+
+def _execute_exact(code, mode):
+    integer_code, exact_code = code
+    if integer_code is not None:
+        result = execute(integer_code)
+        if type(result) is int:
+            return result
+    with _mode_context(mode):
+        return _demote(execute(exact_code))
+
+
+@timed("calculate_expression")
+def calculate_expression(expression, mode=FLOAT):
+    code, error = _compile_raw(expression, mode)
+    if error is not None:
+        raise CalculationError(*error)
+    try:
+        if mode != FLOAT:
+            return _execute_exact(code, mode)
+        result = execute(code)
         return result
-    except ZeroDivisionError:
-        raise ValueError("Błąd: Dzielenie przez zero.")
-    except SyntaxError:
-        raise ValueError("Błąd: Błędna składnia wyrażenia.")
     except Exception as e:
-        raise ValueError("Błąd: " + str(e))
\ No newline at end of file
+        raise CalculationError(error_message(e), error_code(e))
+
+
+BatchResult = namedtuple("BatchResult", "line expression value error")
+
+
+def _evaluate_lines(lines):
+    results = []
+    for expression in lines:
+        code, error = _compile_raw(expression)
+        value = None
+        if error is not None:
+            error = error[0]
+        else:
+            try:
+                value = execute(code)
+            except Exception as e:
+                error = error_message(e)
+        results.append((value, error))
+    return results
+
+
+def evaluate_batch(expressions, chunk_size=1000):
+    # Streams (line, expression, value, error) records; an invalid expression
+    # yields a record with the error message instead of raising
+    line = 0
+    for chunk in _chunks(expressions, chunk_size):
+        for expression, (value, error) in zip(chunk, _evaluate_lines(chunk)):
+            line += 1
+            yield BatchResult(line, expression, value, error)
+
+
+def evaluate_batch_parallel(expressions, jobs=None, chunk_size=10000):
+    # Chunks are spread over a process pool; at most two chunks per worker
+    # are in flight, so memory stays bounded for inputs of any size
+    from concurrent.futures import ProcessPoolExecutor  # slow to import, not needed by the GUI
+
+    jobs = jobs or os.cpu_count() or 1
+    line = 0
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        for chunk in _chunks(expressions, chunk_size):
+            pending.append((chunk, executor.submit(_evaluate_lines, chunk)))
+            if len(pending) >= 2 * jobs:
+                chunk, future = pending.popleft()
+                for expression, (value, error) in zip(chunk, future.result()):
+                    line += 1
+                    yield BatchResult(line, expression, value, error)
+        while pending:
+            chunk, future = pending.popleft()
+            for expression, (value, error) in zip(chunk, future.result()):
+                line += 1
+                yield BatchResult(line, expression, value, error)
+
+
+def _chunks(expressions, chunk_size):
+    chunk = []
+    for expression in expressions:
+        chunk.append(expression.rstrip("\r\n"))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def evaluate_file(path, jobs=1, chunk_size=10000):
+    with open(path, encoding="utf-8") as file:
+        if jobs == 1:
+            yield from evaluate_batch(file, chunk_size)
+        else:
+            yield from evaluate_batch_parallel(file, jobs, chunk_size)
+
+
+VectorizedResult = namedtuple("VectorizedResult", "values zero_division")
+
+
+def _vector_divide(function):
+    def divide(np, left, right):
+        zero_division = right == 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return function(left, np.where(zero_division, 1, right)), zero_division
+    return divide
+
+
+def _vector_power(np, left, right):
+    right = np.asarray(right)
+    if right.dtype.kind in "iu" and (right < 0).any():
+        # Python gives a float for negative integer exponents, NumPy refuses
+        right = right.astype(float)
+    zero_division = (left == 0) & (right < 0)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        return np.power(left, np.where(zero_division, 1, right)), zero_division
+
+
+_VECTOR_OPERATORS = {
+    operator.truediv: _vector_divide(operator.truediv),
+    _floor_divide: _vector_divide(operator.floordiv),
+    operator.pow: _vector_power,
+}
+
+
+class VectorizedExpression:
+    # An expression with variable placeholders, e.g. "a*b+c", compiled once
+    # and evaluated over whole NumPy columns. Division by zero does not
+    # raise: the affected rows are NaN and flagged in the zero_division mask.
+
+    def __init__(self, expression):
+        try:
+            self.code = _Parser(tokenize(expression), allow_variables=True).parse()
+        except SyntaxError:
+            raise CalculationError(SYNTAX_ERROR, SYNTAX)
+        self.variables = tuple(dict.fromkeys(argument for opcode, argument in self.code if opcode == VARIABLE))
+
+    def __call__(self, **columns):
+        import numpy as np
+
+        missing = [name for name in self.variables if name not in columns]
+        if missing:
+            raise ValueError("Błąd: Brak wartości zmiennej %s." % missing[0])
+
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        zero_division = False
+        for opcode, argument in self.code:
+            if opcode == CONST:
+                push(argument)
+            elif opcode == VARIABLE:
+                push(np.asarray(columns[argument]))
+            elif opcode == BINARY:
+                right = pop()
+                left = pop()
+                vector_operator = _VECTOR_OPERATORS.get(argument)
+                if vector_operator is None:
+                    push(argument(left, right))
+                else:
+                    result, mask = vector_operator(np, left, right)
+                    zero_division = zero_division | mask
+                    push(result)
+            else:
+                push(argument(pop()))
+
+        values = np.asarray(stack[0])
+        zero_division = np.broadcast_to(zero_division, values.shape)
+        if zero_division.any():
+            values = np.where(zero_division, np.nan, values)
+        return VectorizedResult(values, zero_division)
+
+
+@lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def compile_vectorized(expression):
+    return VectorizedExpression(expression)
+
+
+def evaluate_vectorized(expression, **columns):
+    return compile_vectorized(expression)(**columns)
+
+
+# Partial parse state of IncrementalEvaluator: the running sum of completed
+# terms, the pending product of the current term and the number being typed
+_State = namedtuple("_State", "text sign term term_op total add_op last power invalid preview")
+_EMPTY_STATE = _State("", 1, None, None, None, None, "", False, False, None)
+
+
+def _complete_factor(state, parse_number):
+    factor = parse_number(state.text)
+    if state.sign < 0:
+        factor = -factor
+    if state.term_op is None:
+        return factor
+    return state.term_op(state.term, factor)
+
+
+def _complete_term(state, parse_number):
+    value = _complete_factor(state, parse_number)
+    if state.add_op is None:
+        return value
+    return state.add_op(state.total, value)
+
+
+def _is_number(text):
+    return _NUMBER_RE.fullmatch(text) is not None
+
+
+class IncrementalEvaluator:
+    # Keeps one partial parse state per character in front of the cursor,
+    # so that typing or removing a character there updates the preview in
+    # O(1). The text after the cursor is kept with the value of every term
+    # in it that follows a '+' or '-': a term does not depend on anything in
+    # front of it, so after an edit the preview is parsed only to the end of
+    # the edited term and the values after it are added to it, one addition
+    # per term. Expressions containing '**' are right-associative and fall
+    # back to full (cached) evaluation of the text, as do numbers with a
+    # large exponent in the rational mode (see is_slow_expression). After the cursor has
+    # moved to the right, the states up to it are computed again when next
+    # needed, at most CATCH_UP_LIMIT of them per needs_full_evaluation;
+    # until they have caught up, the preview is a full evaluation as well.
+
+    def __init__(self, text="", mode=FLOAT):
+        self.mode = mode
+        self._parse_number = _NUMBER_PARSERS[mode]
+        self._exact_exponents = mode == FRACTION
+        self.reset(text)
+
+    def reset(self, text=""):
+        self._states = [_EMPTY_STATE]
+        self._chars = list(text)
+        # The text after the cursor, last character first
+        self._after = []
+        # The terms after the cursor, last one first: the index in _after of
+        # the '+' or '-' in front of the term, whether the term is invalid
+        # and whether it contains '**'; _values holds their values, negated
+        # after a '-', so that they are added up in one call
+        self._terms = []
+        self._values = []
+        self._invalid_terms = 0
+        self._power_terms = 0
+        self._outcome = None
+
+    def push(self, char):
+        if self._after:
+            self._move_cursor(len(self._chars) + len(self._after))
+        self._insert(char)
+
+    def pop(self):
+        if self._after:
+            self._move_cursor(len(self._chars) + len(self._after))
+        if self._chars:
+            self._outcome = None
+            self._chars.pop()
+            del self._states[len(self._chars) + 1:]
+
+    def replace(self, count, text, tail_length=0):
+        # Replaces the `count` characters in front of the last `tail_length`
+        # ones (the text after the cursor) with `text`
+        self._move_cursor(len(self._chars) + len(self._after) - tail_length)
+        if count:
+            del self._chars[len(self._chars) - count:]
+            del self._states[len(self._chars) + 1:]
+        for char in text:
+            self._insert(char)
+        self._outcome = None
+
+    def _insert(self, char):
+        # At the cursor
+        self._outcome = None
+        self._chars.append(char)
+        if len(self._states) == len(self._chars):
+            with _mode_context(self.mode):
+                self._states.append(self._advance(self._states[-1], char))
+
+    @property
+    def text(self):
+        return "".join(self._chars) + "".join(reversed(self._after))
+
+    @property
+    def needs_full_evaluation(self):
+        self._catch_up(CATCH_UP_LIMIT)
+        return len(self._states) <= len(self._chars) or self._evaluate()[0]
+
+    @property
+    def preview(self):
+        self._catch_up(len(self._chars))
+        power, preview = self._evaluate()
+        if power:
+            try:
+                return calculate_expression(self.text, self.mode)
+            except ValueError:
+                return None
+        return _demote(preview)
+
+    def _move_cursor(self, position):
+        chars, after, terms = self._chars, self._after, self._terms
+        if position < len(chars):
+            self._outcome = None
+            while len(chars) > position:
+                char = chars.pop()
+                # A '+' or '-' after a number starts a term, but the one right
+                # after the cursor is parsed with the text in front of it
+                if after and after[-1] in '+-' and (char.isdigit() or char == '.'):
+                    self._push_term()
+                after.append(char)
+            del self._states[position + 1:]
+        elif position > len(chars):
+            self._outcome = None
+            while len(chars) < position:
+                chars.append(after.pop())
+                if terms and terms[-1][0] == len(after) - 1:
+                    _, invalid, power = terms.pop()
+                    self._values.pop()
+                    self._invalid_terms -= invalid
+                    self._power_terms -= power
+
+    def _push_term(self):
+        after, terms = self._after, self._terms
+        start = len(after) - 1
+        sign = after[start]
+        end = terms[-1][0] if terms else -1
+        with _mode_context(self.mode):
+            state = _EMPTY_STATE._replace(last=sign)
+            for index in range(start - 1, end, -1):
+                state = self._advance(state, after[index])
+        value = state.preview
+        if terms:
+            # Followed by another term, so it has to end with a number
+            invalid = state.invalid or value is None or not _is_number(state.text)
+        else:
+            # The last term counts up to its last complete number, but not
+            # when that one could not be evaluated
+            invalid = state.invalid or (value is None and _is_number(state.text))
+        if value is not None and sign == '-':
+            value = value.copy_negate() if isinstance(value, Decimal) else -value
+        terms.append((start, invalid, state.power))
+        self._values.append(value)
+        self._invalid_terms += invalid
+        self._power_terms += state.power
+
+    def _evaluate(self):
+        # (whether the text needs full evaluation, preview before _demote)
+        if self._outcome is None:
+            self._outcome = self._evaluate_after_cursor()
+        return self._outcome
+
+    def _evaluate_after_cursor(self):
+        state = self._states[-1]
+        after, terms = self._after, self._terms
+        end = terms[-1][0] if terms else -1
+        with _mode_context(self.mode):
+            advance = self._advance
+            for index in range(len(after) - 1, end, -1):
+                state = advance(state, after[index])
+            if state.power or self._power_terms:
+                return True, None
+            if not terms:
+                return False, state.preview
+            if state.invalid or self._invalid_terms or not _is_number(state.text):
+                return False, None
+            values = self._values
+            try:
+                # Left to right, as the parser adds them
+                total = _complete_term(state, self._parse_number)
+                total = reduce(operator.add, islice(reversed(values), len(values) - 1), total)
+                return False, total if values[0] is None else total + values[0]
+            except Exception:
+                return False, None
+
+    def _catch_up(self, limit):
+        states = self._states
+        start = len(states) - 1
+        if start < len(self._chars):
+            self._outcome = None
+            with _mode_context(self.mode):
+                advance = self._advance
+                for char in self._chars[start:start + limit]:
+                    states.append(advance(states[-1], char))
+
+    def _advance(self, state, char):
+        if state.invalid or state.power:
+            return state
+        text = state.text
+        if char.isdigit() or char == '.' or (char in 'eE' and text) or (char in '+-' and text[-1:] in ('e', 'E')):
+            text += char
+            if _is_number(text):
+                if self._exact_exponents and _LARGE_EXPONENT_RE.search(text):
+                    # Left to the full evaluation, in the worker, like '**'
+                    return state._replace(text=text, last=char, power=True, preview=None)
+                try:
+                    preview = _complete_term(state._replace(text=text), self._parse_number)
+                except Exception:
+                    preview = None
+                return state._replace(text=text, last=char, preview=preview)
+            if _NUMBER_PREFIX_RE.fullmatch(text):
+                return state._replace(text=text, last=char)
+            return state._replace(invalid=True, preview=None)
+        if char in '+-':
+            if not text:
+                # Unary sign of the next factor
+                sign = -state.sign if char == '-' else state.sign
+                return state._replace(sign=sign, last='u')
+            if not _is_number(text):
+                return state._replace(invalid=True, preview=None)
+            try:
+                total = _complete_term(state, self._parse_number)
+            except Exception:
+                return state._replace(invalid=True, preview=None)
+            return _EMPTY_STATE._replace(total=total, add_op=_BINARY_OPERATORS[char], last=char, preview=state.preview)
+        if char in '*/':
+            if not text:
+                if state.last == char:
+                    if char == '*':
+                        return state._replace(power=True)
+                    return state._replace(term_op=_floor_divide, last='//')
+                return state._replace(invalid=True, preview=None)
+            if not _is_number(text):
+                return state._replace(invalid=True, preview=None)
+            try:
+                term = _complete_factor(state, self._parse_number)
+            except Exception:
+                return state._replace(invalid=True, preview=None)
+            return state._replace(text="", sign=1, term=term, term_op=_BINARY_OPERATORS[char], last=char)
+        return state._replace(invalid=True, preview=None)
+
+
+class ExpressionValidator:
+    # Accepts characters one at a time while they can still be extended to
+    # an expression the parser takes, e.g. rejects "1..", "*2" or "2***".
+    # Keeps one state (number typed so far, last accepted character) per
+    # character, so that removing the last one is O(1) as well. A state only
+    # depends on the number it is in, so after an edit in the middle the
+    # states are computed again only until they match the old ones.
+
+    def __init__(self, text=""):
+        self.reset(text)
+
+    def reset(self, text=""):
+        # Text set from outside (e.g. a result) is taken as it is; if it is
+        # not valid, nothing more is accepted until it is removed
+        self._states = [("", None)]
+        self._chars = []
+        self.replace(0, text)
+
+    def __len__(self):
+        return len(self._chars)
+
+    def push(self, char):
+        state = self._states[-1]
+        state = None if state is None else self._advance(state, char)
+        if state is None:
+            return False
+        self._states.append(state)
+        self._chars.append(char)
+        return True
+
+    def pop(self):
+        if self._chars:
+            self._states.pop()
+            self._chars.pop()
+
+    def insert(self, text, tail_length=0):
+        # Returns the accepted characters of `text`, inserted in front of the
+        # last `tail_length` ones; nothing is inserted if those would no
+        # longer be accepted
+        if not tail_length:
+            return [char for char in text if self.push(char)]
+        end = len(self._chars) - tail_length
+        state = self._states[end]
+        accepted = []
+        states = []
+        for char in text:
+            next_state = None if state is None else self._advance(state, char)
+            if next_state is not None:
+                state = next_state
+                accepted.append(char)
+                states.append(state)
+        if accepted and self._splice(end, 0, accepted, states, state, True):
+            return accepted
+        return []
+
+    def replace(self, count, text, tail_length=0):
+        # Replaces the `count` characters in front of the last `tail_length`
+        # ones with `text`, taken as it is, like in reset()
+        end = len(self._chars) - tail_length - count
+        state = self._states[end]
+        states = []
+        for char in text:
+            state = None if state is None else self._advance(state, char)
+            states.append(state)
+        self._splice(end, count, text, states, state, False)
+
+    def _splice(self, end, count, text, states, state, strict):
+        # Puts `text` with its `states` in place of `count` characters at
+        # `end`, and computes the states after it again until they are the
+        # same as before. With `strict`, gives up (returns False) if a
+        # character after it would no longer be accepted.
+        old_states, chars = self._states, self._chars
+        index = end + count
+        while index < len(chars):
+            state = None if state is None else self._advance(state, chars[index])
+            if state == old_states[index + 1]:
+                break
+            if state is None and strict:
+                return False
+            states.append(state)
+            index += 1
+        old_states[end + 1:index + 1] = states
+        chars[end:end + count] = text
+        return True
+
+    @property
+    def complete(self):
+        number, _ = self._states[-1] or ("", None)
+        return _is_number(number)
+
+    def _advance(self, state, char):
+        number, last = state
+        if char.isdigit() or char == '.' or (char in 'eE' and number) or (char in '+-' and number[-1:] in ('e', 'E')):
+            number += char
+            if _is_number(number) or _NUMBER_PREFIX_RE.fullmatch(number):
+                return number, 'n'
+            return None
+        if char in '+-':
+            if not number:
+                return "", 'u'
+            return ("", char) if _is_number(number) else None
+        if char in '*/':
+            if number:
+                return ("", char) if _is_number(number) else None
+            if last == char:
+                # The second character of '**' or '//'
+                return "", char + char
+            return None
+        return None
+
+
+def main(argv=None):
+    import argparse
+
+    from result_format import exact_text
+
+    parser = argparse.ArgumentParser(
+        prog="python -m calculator",
+        description="Oblicza wyrażenia z pliku, jedno w każdej linii.")
+    parser.add_argument("path", nargs="?", default="-",
+                        help="plik z wyrażeniami ('-' oznacza standardowe wejście)")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="liczba procesów (0 - tyle, ile rdzeni)")
+    parser.add_argument("--chunk-size", type=int, default=10000,
+                        help="liczba wyrażeń przekazywanych do procesu naraz")
+    args = parser.parse_args(argv)
+
+    if args.path == "-":
+        if args.jobs == 1:
+            results = evaluate_batch(sys.stdin, args.chunk_size)
+        else:
+            results = evaluate_batch_parallel(sys.stdin, args.jobs, args.chunk_size)
+    else:
+        results = evaluate_file(args.path, args.jobs, args.chunk_size)
+
+    errors = 0
+    write = sys.stdout.write
+    for result in results:
+        if result.error is None:
+            write(f"{result.expression}={exact_text(result.value)}\n")
+        else:
+            errors += 1
+            write(f"{result.expression}: {result.error}\n")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,382 @@
+import re
+from functools import partial
+
+from calculator import DECIMAL_OPERATION, FLOAT, INTERRUPTED, OVERFLOW, SYNTAX, ZERO_DIVISION, IncrementalEvaluator
+from evaluation_scheduler import EvaluationScheduler
+from expression_buffer import ExpressionBuffer
+from history_log import HistoryLog
+from history_store import DEFAULT_CAPACITY, HistoryStore
+from input_pipeline import InputPipeline
+from result_cache import RESULT_CACHE_SIZE, ResultCache
+from result_format import exact_text, format_result
+from subscriptions import Subscribers
+
+# The calculator without its widgets, shared by both GUI front ends, which
+# only draw what they are told and pass clicks and keys on.
+
+# History search shows at most this many matches, and works in slices of
+# this many seconds between which the main loop runs
+SEARCH_LIMIT = 1000
+SEARCH_SLICE = 0.005
+
+# Longest part of the expression a window is given to draw: in a long
+# expression only the characters around the cursor are drawn again
+EXPRESSION_WIDTH = 256
+
+# Short texts for errors shown in place of the result, by CalculationError code
+ERROR_LABELS = {
+    ZERO_DIVISION: "Dzielenie przez zero",
+    SYNTAX: "Błędne wyrażenie",
+    DECIMAL_OPERATION: "Niedozwolona operacja",
+    OVERFLOW: "Wynik poza zakresem",
+    INTERRUPTED: "Przerwano obliczenia",
+}
+
+# Searches by result: "=5", ">100", "<=0.5", "10..20"
+_COMPARISON_QUERY_RE = re.compile(r"(<=|>=|<|>|=)(.+)")
+_RANGE_QUERY_RE = re.compile(r"(.+?)\.\.(.+)")
+
+
+def error_label(error):
+    return ERROR_LABELS.get(getattr(error, "code", None), str(error))
+
+
+def _parse_bound(text):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def _result_query(query):
+    # Arguments of HistoryStore.iter_results, or None for a search by expression
+    try:
+        match = _COMPARISON_QUERY_RE.fullmatch(query)
+        if match is not None:
+            operator, value = match.group(1), _parse_bound(match.group(2))
+            if operator == "=":
+                return value, value, True, True
+            if operator[0] == ">":
+                return value, None, operator == ">=", True
+            return None, value, True, operator == "<="
+        match = _RANGE_QUERY_RE.fullmatch(query)
+        if match is not None:
+            return _parse_bound(match.group(1)), _parse_bound(match.group(2)), True, True
+    except ValueError:
+        pass
+    return None
+
+
+class HistoryModel:
+    # Calculations made so far, kept in a HistoryStore and backed by the
+    # append-only log. Subscribers get (action, added, removed): "append"
+    # with the number of entries added at the end and evicted from the start,
+    # or "clear". Subscribed methods are held weakly, so a closed window
+    # that forgot to unsubscribe is not kept alive by the history.
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, log_path=None, entry_format="{expression}={result}"):
+        self.capacity = capacity
+        self.log_path = log_path
+        self.entry_format = entry_format
+        self.history_log = None
+        self._history = None
+        self.subscribers = Subscribers()
+
+    @property
+    def history_of_calculations(self):
+        # The log is opened and read on first use, so that startup does not touch it
+        if self._history is None:
+            self._history = HistoryStore(self.capacity)
+            if self.log_path is not None:
+                self.history_log = HistoryLog(self.log_path)
+                for entry in self.history_log.load(self.capacity):
+                    self._history.append(entry.expression, entry.result, entry.timestamp, entry.mode)
+        return self._history
+
+    def subscribe(self, callback):
+        # Returns the Subscription; cancel it (or use cancel_on) to unsubscribe
+        return self.subscribers.subscribe(callback)
+
+    def history_updated(self, action, added, removed):
+        self.subscribers.notify(action, added, removed)
+
+    def add_to_history(self, expression, result, mode=None):
+        history = self.history_of_calculations
+        evicted = history.append(expression, result, mode=mode)
+        if self.history_log is not None:
+            self.history_log.append(history[-1])
+        self.history_updated("append", 1, 0 if evicted is None else 1)
+
+    def extend_history(self, calculations):
+        # (expression, result), (expression, result, timestamp) or
+        # (expression, result, timestamp, mode) tuples, announced as a single update
+        history = self.history_of_calculations
+        held = len(history)
+        added = evicted = 0
+        for calculation in calculations:
+            if history.append(*calculation) is not None:
+                evicted += 1
+            if self.history_log is not None:
+                self.history_log.append(history[-1])
+            added += 1
+        if added:
+            # Entries added and evicted within the batch are not announced
+            self.history_updated("append", min(added, len(history)), min(evicted, held))
+
+    def iter_matches(self, query):
+        # Entries matching a search box query: a part of the expression
+        # (newest first) or a condition on the result (by value). None is
+        # yielded now and then, so that the caller can pause the search.
+        query = "".join(query.split())
+        result_query = _result_query(query)
+        if result_query is not None:
+            return self.history_of_calculations.iter_results(*result_query)
+        return self.history_of_calculations.iter_search(query)
+
+    def get_history(self, start=0):
+        history = self.history_of_calculations
+        return [self.format_entry(history[index]) for index in range(start, len(history))]
+
+    def format_entry(self, entry):
+        return self.entry_format.format(expression=entry.expression, result=format_result(entry.result))
+
+    def clear_history(self):
+        self.history_of_calculations.clear()
+        if self.history_log is not None:
+            self.history_log.clear()
+        self.history_updated("clear", 0, 0)
+
+    def close(self):
+        if self.history_log is not None:
+            self.history_log.close()
+
+
+class CalculatorSession:
+    # State of one calculator window: the expression being typed, its live
+    # preview and the calculations sent off with '='. The expression is an
+    # ExpressionBuffer, edited at its cursor, with undo and redo. The view is
+    # told what to show through show_expression (with at most
+    # EXPRESSION_WIDTH characters and the cursor's offset in them),
+    # show_preview, show_pending, show_result and show_error (with a
+    # CalculationError, shown until the next input replaces it). `post`
+    # hands results back to the main loop (GLib.idle_add), `schedule` runs a
+    # redraw on the next frame.
+    # With `result_as_operand` a result replaces the expression and the
+    # calculation goes on from it; otherwise '=' starts a new expression.
+
+    def __init__(self, view, history, post, schedule, mode=FLOAT, result_cache=None, result_as_operand=False):
+        self.view = view
+        self.history = history
+        self.result_as_operand = result_as_operand
+        self.buffer = ExpressionBuffer()
+        self.result_shown = False
+        # The last result while it is on display, for copy_text()
+        self.result = None
+        self.evaluator = IncrementalEvaluator(mode=mode)
+        self.scheduler = EvaluationScheduler(post, mode=mode, cache=result_cache)
+        self.preview_scheduler = EvaluationScheduler(post, mode=mode)
+        # Clicks, keys and pastes are redrawn at most once per frame
+        self.input_pipeline = InputPipeline(schedule, self.redraw)
+
+    @property
+    def mode(self):
+        return self.evaluator.mode
+
+    @property
+    def expression(self):
+        return self.buffer.text
+
+    def press(self, label):
+        self.clear_result()
+        if label == '=':
+            self.calculate()
+        elif label == '←':
+            self.edit(self.buffer.delete_backward())
+        elif label == 'C':
+            self.set_expression("")
+        else:
+            self.type_text(label)
+
+    def clear_result(self):
+        # Clean the result if the previous expression has been calculated
+        if self.result_shown and not self.buffer:
+            self.view.show_preview(None)
+        self.result_shown = False
+        self.result = None
+
+    def copy_text(self):
+        # The whole of the result on display, or of the expression; a huge
+        # result is written out only now
+        if self.result is not None:
+            return exact_text(self.result)
+        return self.buffer.text
+
+    def type_text(self, text):
+        # Only the characters that keep the expression valid are taken; they
+        # go in at the cursor. A paste comes here directly, so the result on
+        # display is cleared here too, or Ctrl+C would still copy it.
+        self.clear_result()
+        tail_length = self.buffer.tail_length
+        accepted = self.input_pipeline.feed(text, tail_length)
+        if accepted:
+            self.buffer.insert(accepted)
+            self.evaluator.replace(0, accepted, tail_length)
+
+    def set_expression(self, expression):
+        change = self.buffer.set_text(expression)
+        if change is not None:
+            self.apply_change(change)
+        self.input_pipeline.invalidate()
+
+    def edit(self, change):
+        # Redraws after a change made by the buffer, None if nothing changed
+        if change is not None:
+            self.apply_change(change)
+            self.input_pipeline.invalidate()
+
+    def apply_change(self, change):
+        # Brings the evaluator and the validator up to date with the buffer
+        position, removed, inserted = change
+        tail_length = self.buffer.tail_length
+        self.evaluator.replace(len(removed), inserted, tail_length)
+        self.input_pipeline.replace(len(removed), inserted, tail_length)
+
+    def delete_forward(self):
+        self.clear_result()
+        self.edit(self.buffer.delete_forward())
+
+    def undo(self):
+        self.clear_result()
+        self.edit(self.buffer.undo())
+
+    def redo(self):
+        self.clear_result()
+        self.edit(self.buffer.redo())
+
+    def move_cursor(self, position):
+        if position != self.buffer.cursor:
+            self.buffer.move_cursor(position)
+            self.input_pipeline.invalidate()
+
+    def cursor_left(self):
+        self.move_cursor(self.buffer.cursor - 1)
+
+    def cursor_right(self):
+        self.move_cursor(self.buffer.cursor + 1)
+
+    def cursor_home(self):
+        self.move_cursor(0)
+
+    def cursor_end(self):
+        self.move_cursor(len(self.buffer))
+
+    def calculate(self):
+        # The result arrives in on_result_ready; typing goes on meanwhile
+        self.input_pipeline.flush()
+        expression = self.buffer.text
+        if not self.result_as_operand:
+            # Cleared as a change of its own, so that undo brings it back
+            change = self.buffer.set_text("")
+            if change is not None:
+                self.apply_change(change)
+        self.preview_scheduler.cancel()
+        self.view.show_pending()
+        # The mode is that of the request: a mode change does not wait for the result
+        self.scheduler.submit(expression, partial(self.on_result_ready, expression, self.mode))
+
+    def on_result_ready(self, expression, mode, result, error):
+        if error is not None:
+            # The error takes the place of the preview until the next input
+            self.input_pipeline.cancel()
+            self.preview_scheduler.cancel()
+            self.show_expression()
+            self.view.show_error(error)
+            return
+        self.history.add_to_history(expression, result, mode)
+        if self.result_as_operand:
+            # Unless the expression has been changed in the meantime
+            if self.buffer.text == expression:
+                self.result = result
+                try:
+                    operand = str(result)
+                except ValueError:
+                    # More digits than the parser reads (sys.get_int_max_str_digits());
+                    # the expression, which gives the same result, stays
+                    operand = expression
+                change = self.buffer.set_text(operand)
+                if change is not None:
+                    self.apply_change(change)
+                self.show_expression()
+            self.update_preview()
+        elif not self.buffer:
+            # Not shown if the next expression has been started in the meantime
+            self.result_shown = True
+            self.result = result
+            self.view.show_result(result)
+
+    def redraw(self):
+        self.show_expression()
+        self.update_preview()
+
+    def show_expression(self):
+        self.view.show_expression(*self.buffer.window(EXPRESSION_WIDTH))
+
+    def update_preview(self):
+        # Live result of the expression typed so far; with '**' (or a large
+        # exponent in the rational mode) it needs a full evaluation, which
+        # can be slow and runs in the worker
+        if self.evaluator.needs_full_evaluation:
+            self.preview_scheduler.submit(self.buffer.text, self.on_preview_ready)
+        else:
+            self.preview_scheduler.cancel()
+            self.view.show_preview(self.evaluator.preview)
+
+    def on_preview_ready(self, preview, error):
+        self.view.show_preview(preview)
+
+    def set_mode(self, mode):
+        # The new mode applies from the next calculation on; the typed expression is re-read
+        self.evaluator = IncrementalEvaluator(self.buffer.text, mode)
+        self.scheduler.mode = mode
+        self.preview_scheduler.mode = mode
+        if self.buffer:
+            self.update_preview()
+
+    def close(self):
+        self.scheduler.close()
+        self.preview_scheduler.close()
+
+
+class CalculatorCore:
+    # What an application shares between its windows: the history, the
+    # result cache and the arithmetic mode of every session
+
+    def __init__(self, history, result_cache_size=RESULT_CACHE_SIZE, mode=FLOAT):
+        self.history = history
+        self.result_cache = ResultCache(result_cache_size)
+        self.mode = mode
+        self.sessions = []
+
+    def new_session(self, view, post, schedule, result_as_operand=False):
+        session = CalculatorSession(view, self.history, post, schedule, self.mode, self.result_cache,
+                                    result_as_operand)
+        self.sessions.append(session)
+        return session
+
+    def close_session(self, session):
+        session.close()
+        self.sessions.remove(session)
+
+    def set_mode(self, mode):
+        self.mode = mode
+        for session in self.sessions:
+            session.set_mode(mode)
+
+    def seed_result_cache(self):
+        # Past calculations warm up the result cache
+        self.result_cache.seed(self.history.history_of_calculations)
+
+    def close(self):
+        for session in list(self.sessions):
+            self.close_session(session)
+        self.history.close()
@@ -0,0 +1,465 @@
+import sys
+import time
+
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import Gtk, Gio, GLib, GObject, Gdk
+from calculator import DECIMAL, FLOAT, FRACTION
+from calculator_core import SEARCH_LIMIT, SEARCH_SLICE, CalculatorCore, HistoryModel
+from history_log import default_log_path
+from history_store import DEFAULT_CAPACITY
+from metrics import DUMP_INTERVAL, dump_metrics, metrics_enabled, timed
+from result_cache import RESULT_CACHE_SIZE
+from startup_profile import StartupProfile
+from style_manager import StyleManager
+
+# The GTK side shared by both front ends (calculator_gui and
+# pygtk_calculator_gui): keys, the history model as a GObject, and what the
+# windows and the application do. The front ends only lay out their widgets.
+
+# Keys acting like the '=' and '←' buttons, and Escape clearing the expression
+KEY_LABELS = {
+    Gdk.KEY_Return: '=',
+    Gdk.KEY_KP_Enter: '=',
+    Gdk.KEY_BackSpace: '←',
+    Gdk.KEY_Escape: 'C',
+}
+
+# Keys moving the cursor and deleting after it, by session method
+KEY_EDITS = {
+    Gdk.KEY_Left: "cursor_left",
+    Gdk.KEY_KP_Left: "cursor_left",
+    Gdk.KEY_Right: "cursor_right",
+    Gdk.KEY_KP_Right: "cursor_right",
+    Gdk.KEY_Home: "cursor_home",
+    Gdk.KEY_KP_Home: "cursor_home",
+    Gdk.KEY_End: "cursor_end",
+    Gdk.KEY_KP_End: "cursor_end",
+    Gdk.KEY_Delete: "delete_forward",
+    Gdk.KEY_KP_Delete: "delete_forward",
+}
+
+# The same with Ctrl held; Ctrl+Shift+Z redoes as well
+CONTROL_KEY_EDITS = {
+    Gdk.KEY_z: "undo",
+    Gdk.KEY_y: "redo",
+}
+
+
+class HistoryBox(GObject.GObject, HistoryModel):
+    # The shared history model, announcing changes as a GObject signal;
+    # windows subscribe weakly through HistoryModel.subscribe instead
+    __gsignals__ = {
+        # (action, added, removed): "append" with the number of entries added
+        # at the end and evicted from the start, or "clear"
+        'history-updated': (GObject.SIGNAL_RUN_FIRST, None, (str, int, int))
+    }
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, log_path=None, entry_format="{expression}={result}"):
+        GObject.GObject.__init__(self)
+        HistoryModel.__init__(self, capacity, log_path, entry_format)
+
+    def history_updated(self, action, added, removed):
+        HistoryModel.history_updated(self, action, added, removed)
+        self.emit('history-updated', action, added, removed)
+
+
+class CalculatorWindowBase(Gtk.ApplicationWindow):
+    # A window with its own calculator session, fed by its buttons, the
+    # keyboard and the clipboard. A subclass lays out the widgets, calls
+    # start_session and is the session's view (show_expression, show_preview,
+    # show_pending, show_result, show_error).
+
+    def start_session(self, core, result_as_operand=False):
+        self.core = core
+        self.session = core.new_session(self, GLib.idle_add, self.add_tick_callback,
+                                        result_as_operand=result_as_operand)
+        self.clipboard = Gtk.Clipboard.get(Gdk.SELECTION_CLIPBOARD)
+        self.connect("destroy", self.on_window_destroy)
+        self.connect("key-press-event", self.on_key_press)
+
+    @timed("CalculatorWindow.on_button_clicked")
+    def on_button_clicked(self, button):
+        self.session.press(button.get_label())
+
+    def on_key_press(self, widget, event):
+        keyval = event.keyval
+        if event.state & Gdk.ModifierType.CONTROL_MASK:
+            keyval = Gdk.keyval_to_lower(keyval)
+            if keyval == Gdk.KEY_v:
+                self.clipboard.request_text(self.on_clipboard_text)
+                return True
+            if keyval == Gdk.KEY_c and not self.has_selection():
+                # The exact result, however long, or the whole expression
+                self.clipboard.set_text(self.session.copy_text(), -1)
+                return True
+            edit = CONTROL_KEY_EDITS.get(keyval)
+            if edit is None:
+                # Other shortcuts (e.g. copying a selection) are left to the widgets
+                return False
+            if edit == "undo" and event.state & Gdk.ModifierType.SHIFT_MASK:
+                edit = "redo"
+            getattr(self.session, edit)()
+            return True
+        edit = KEY_EDITS.get(keyval)
+        if edit is not None:
+            getattr(self.session, edit)()
+            return True
+        label = KEY_LABELS.get(keyval)
+        if label is None:
+            char = Gdk.keyval_to_unicode(keyval)
+            if not char:
+                return False
+            label = chr(char)
+        self.session.press(label)
+        return True
+
+    def has_selection(self):
+        # Whether a widget has selected text, which Ctrl+C then copies instead
+        return False
+
+    def on_clipboard_text(self, clipboard, text):
+        if text:
+            self.session.type_text(text)
+
+    def on_window_destroy(self, window):
+        self.core.close_session(self.session)
+        window.destroy()
+
+
+class HistoryWindowBase(Gtk.ApplicationWindow):
+    # A window listing the history, filtered by a search entry. A subclass
+    # lays out the widgets and hands the entry and the text view to
+    # connect_history.
+
+    def connect_history(self, history_box, search_entry, textview):
+        self.history_box = history_box
+        self.search_entry = search_entry
+        self.textview = textview
+        self.search_source = None
+        self.connect("destroy", self.on_window_destroy)
+        search_entry.connect("search-changed", self.on_search_changed)
+        # Ended when the window is destroyed, so a closed window gets no more updates
+        history_box.subscribe(self.on_history_updated).cancel_on(self)
+        self.update_history_list()
+
+    @timed("HistoryWindow.update_history_list")
+    def update_history_list(self, *_):
+        history_text = "\n".join(self.history_box.get_history())
+        buffer = self.textview.get_buffer()
+        buffer.set_text(history_text)
+
+    @timed("HistoryWindow.on_history_updated")
+    def on_history_updated(self, action, added, removed):
+        if self.search_entry.get_text().strip():
+            self.on_search_changed(self.search_entry)
+            return
+        # Applies only the delta to the buffer instead of rebuilding it
+        buffer = self.textview.get_buffer()
+        if action == "clear":
+            buffer.set_text("")
+            return
+        if removed:
+            buffer.delete(buffer.get_start_iter(), buffer.get_iter_at_line(removed))
+        lines = self.history_box.get_history(len(self.history_box.history_of_calculations) - added)
+        text = "\n".join(lines)
+        if buffer.get_char_count():
+            text = "\n" + text
+        buffer.insert(buffer.get_end_iter(), text)
+
+    def on_search_changed(self, entry):
+        self.cancel_search()
+        query = entry.get_text()
+        if not query.strip():
+            self.update_history_list()
+            return
+        # Matches are gathered in short slices of idle time, so typing is never blocked
+        self.search_source = GLib.idle_add(self.continue_search, self.history_box.iter_matches(query), [])
+
+    def continue_search(self, matches, lines):
+        deadline = time.perf_counter() + SEARCH_SLICE
+        for entry in matches:
+            if entry is not None:
+                lines.append(self.history_box.format_entry(entry))
+                if len(lines) >= SEARCH_LIMIT:
+                    break
+            elif time.perf_counter() >= deadline:
+                return True
+        self.search_source = None
+        self.textview.get_buffer().set_text("\n".join(lines))
+        return False
+
+    def cancel_search(self):
+        if self.search_source is not None:
+            GLib.source_remove(self.search_source)
+            self.search_source = None
+
+    def on_window_destroy(self, window):
+        self.cancel_search()
+        window.destroy()
+
+
+class CalculatorApplicationBase(Gtk.Application):
+    # The application around the windows: the shared core and history, the
+    # window registry, actions and menu, deferred startup work, the optional
+    # evaluation service, and history export and import. A subclass fills in
+    # window_factories and adds its About menu section and actions.
+
+    # How the history window shows an entry
+    ENTRY_FORMAT = "{expression}={result}"
+    # Windows built in idle time after the first frame
+    DEFERRED_WINDOWS = ("history",)
+
+    def __init__(self, profile=None, result_cache_size=RESULT_CACHE_SIZE, service_path=None):
+        super().__init__(application_id="com.example.calculator", flags=Gio.ApplicationFlags.FLAGS_NONE)
+        self.profile = profile
+        self.service_path = service_path
+        self.service = None
+        self.file_chooser = None
+        self.history_import = None
+        history_box = HistoryBox(log_path=default_log_path(), entry_format=self.ENTRY_FORMAT)
+        self.core = CalculatorCore(history_box, result_cache_size)
+        self.history_box = self.core.history
+        StyleManager.get_default().apply()
+        self.mark_startup_phase("wczytanie CSS")
+
+        # Windows built on first use and presented again, by name
+        self.windows = {}
+        self.window_factories = {}
+        # Further calculators, each with a session of its own; closing one destroys it
+        self.calculators = []
+
+        self.connect("startup", self.on_startup)
+        self.connect("activate", self.on_activate)
+        self.connect("shutdown", self.on_shutdown)
+
+    def get_actions(self):
+        # (name, callback) of the app.* actions without a state
+        return [
+            ("calculator", self.on_calculator_clicked),
+            ("history", self.on_history_clicked),
+            ("export", self.on_export_activate),
+            ("import", self.on_import_activate),
+            ("quit", self.on_quit_activate),
+        ]
+
+    def on_startup(self, _):
+        for name, callback in self.get_actions():
+            action = Gio.SimpleAction.new(name, None)
+            action.connect("activate", callback)
+            self.add_action(action)
+
+        # Arithmetic mode, chosen with the app.mode::<name> menu items
+        mode_action = Gio.SimpleAction.new_stateful("mode", GLib.VariantType.new("s"), GLib.Variant.new_string(self.core.mode))
+        mode_action.connect("change-state", self.on_mode_change_state)
+        self.add_action(mode_action)
+
+        # One menu model shared by every window
+        self.set_menubar(self.build_menu_model())
+        self.mark_startup_phase("menu i akcje")
+        # Metrics (CALCULATOR_METRICS) are written every few seconds and at exit
+        if metrics_enabled():
+            GLib.timeout_add_seconds(DUMP_INTERVAL, dump_metrics)
+        if self.service_path is not None:
+            self.start_service()
+
+    def start_service(self):
+        # Serves other local processes (--serve); their results go to the shared history
+        from evaluation_service import EvaluationService
+        service = EvaluationService(self.history_box, GLib.idle_add, self.core.mode)
+        try:
+            service.start(self.service_path)
+        except OSError as e:
+            print("nie uruchomiono usługi: %s" % e, file=sys.stderr)
+            return
+        self.service = service
+
+    def on_activate(self, _):
+        if "calculator" in self.windows:
+            self.present_window("calculator")
+            return
+        # Only the calculator is built before the first frame, the rest waits for idle time
+        window = self.get_window("calculator")
+        self.mark_startup_phase("budowa widżetów")
+        self.first_draw_handler = window.connect_after("draw", self.on_first_draw)
+        self.present_window("calculator")
+
+    def on_first_draw(self, window, _):
+        window.disconnect(self.first_draw_handler)
+        self.mark_startup_phase("pierwsze rysowanie")
+        if self.profile is not None:
+            self.profile.report()
+        GLib.idle_add(self.build_deferred_windows)
+        return False
+
+    def build_deferred_windows(self):
+        # History (and its log) is read here, so that opening it later is instant
+        for name in self.DEFERRED_WINDOWS:
+            self.get_window(name)
+        # Past calculations warm up the result cache
+        self.core.seed_result_cache()
+        return False
+
+    def mark_startup_phase(self, phase):
+        if self.profile is not None:
+            self.profile.mark(phase)
+
+    def build_menu_model(self):
+        menu_bar = Gio.Menu()
+
+        # Sekcja Aplikacja
+        menu_application = Gio.Menu()
+        menu_application.append("Kalkulator", "app.calculator")
+        menu_application.append("Historia", "app.history")
+        menu_application.append("Eksportuj historię…", "app.export")
+        menu_application.append("Importuj historię…", "app.import")
+
+        # Osobna sekcja, oddzielona kreską
+        quit_section = Gio.Menu()
+        quit_section.append("Wyjście", "app.quit")
+        menu_application.append_section(None, quit_section)
+
+        menu_bar.append_submenu("Aplikacja", menu_application)
+
+        # Sekcja Tryb
+        menu_mode = Gio.Menu()
+        menu_mode.append("Zmiennoprzecinkowy", "app.mode::" + FLOAT)
+        menu_mode.append("Dziesiętny", "app.mode::" + DECIMAL)
+        menu_mode.append("Ułamkowy", "app.mode::" + FRACTION)
+        menu_bar.append_submenu("Tryb", menu_mode)
+
+        self.append_about_menu(menu_bar)
+        return menu_bar
+
+    def append_about_menu(self, menu_bar):
+        # The front end's About section, last in the menu bar
+        pass
+
+    def get_window(self, name):
+        window = self.windows.get(name)
+        if window is None:
+            window = self.window_factories[name]()
+            window.connect("delete-event", self.on_window_delete)
+            window.connect("hide", self.on_window_hide)
+            window.connect("destroy", self.on_registered_window_destroy, name)
+            self.windows[name] = window
+        return window
+
+    def present_window(self, name):
+        window = self.get_window(name)
+        if not window.get_visible():
+            window.show_all()
+        window.present()
+        return window
+
+    def on_window_delete(self, window, event):
+        # Closing only hides the window, so it can be presented again
+        window.hide()
+        return True
+
+    def on_window_hide(self, window):
+        self.quit_unless_visible()
+
+    def quit_unless_visible(self):
+        windows = list(self.windows.values()) + self.calculators
+        if not any(other.get_visible() for other in windows):
+            self.quit()
+
+    def on_registered_window_destroy(self, window, name):
+        if self.windows.get(name) is window:
+            del self.windows[name]
+
+    def on_calculator_clicked(self, *_):
+        # The first calculator if it is closed, otherwise one more
+        # calculator per click, each with its own expression
+        if not self.get_window("calculator").get_visible():
+            self.present_window("calculator")
+            return
+        window = self.window_factories["calculator"]()
+        window.connect("destroy", self.on_calculator_destroy)
+        self.calculators.append(window)
+        window.show_all()
+        window.present()
+
+    def on_calculator_destroy(self, window):
+        self.calculators.remove(window)
+        self.quit_unless_visible()
+
+    def on_history_clicked(self, *_):
+        self.present_window("history")
+
+    def on_quit_activate(self, *_):
+        self.quit()
+
+    def on_export_activate(self, *_):
+        self.choose_history_file(Gtk.FileChooserAction.SAVE, "Eksportuj", self.export_history_to)
+
+    def on_import_activate(self, *_):
+        self.choose_history_file(Gtk.FileChooserAction.OPEN, "Importuj", self.import_history_from)
+
+    def choose_history_file(self, action, accept_label, callback):
+        # Native file chooser, not modal; kept referenced until it answers
+        chooser = Gtk.FileChooserNative.new("Historia obliczeń", self.get_active_window(), action, accept_label, "Anuluj")
+        if action == Gtk.FileChooserAction.SAVE:
+            chooser.set_do_overwrite_confirmation(True)
+            chooser.set_current_name("historia.csv")
+        chooser.connect("response", self.on_history_file_chosen, callback)
+        self.file_chooser = chooser
+        chooser.show()
+
+    def on_history_file_chosen(self, chooser, response, callback):
+        self.file_chooser = None
+        if response == Gtk.ResponseType.ACCEPT:
+            callback(chooser.get_filename())
+        chooser.destroy()
+
+    def export_history_to(self, path):
+        # CSV for a .csv path, the columnar format otherwise (see history_export)
+        from history_export import export_history
+        try:
+            export_history(self.history_box.history_of_calculations, path)
+        except OSError as e:
+            print("nie wyeksportowano historii: %s" % e, file=sys.stderr)
+
+    def import_history_from(self, path):
+        # Imported in chunks during idle time; the history window fills in as it goes
+        from history_export import HistoryImport, import_history
+        self.history_import = HistoryImport(self.history_box, import_history(path, self.history_box.capacity),
+                                            self.on_import_done)
+        GLib.idle_add(self.history_import.step)
+
+    def on_import_done(self, error):
+        self.history_import = None
+        if error is not None:
+            print("nie zaimportowano historii: %s" % error, file=sys.stderr)
+
+    def on_mode_change_state(self, action, state):
+        action.set_state(state)
+        self.core.set_mode(state.get_string())
+        if self.service is not None:
+            self.service.mode = state.get_string()
+
+    def on_shutdown(self, app):
+        if self.service is not None:
+            self.service.close()
+        self.core.close()
+
+
+def main(application_class, import_start, import_end):
+    # Command line of both front ends; import_start and import_end bound the
+    # front end's imports, the first phase of --profile-startup
+    profile = None
+    if "--profile-startup" in sys.argv:
+        profile = StartupProfile(import_start)
+        profile.mark("importy", import_end)
+    result_cache_size = RESULT_CACHE_SIZE
+    service_path = None
+    for argument in sys.argv[1:]:
+        if argument.startswith("--result-cache-size="):
+            result_cache_size = int(argument.split("=", 1)[1])
+        # --serve[=PATH]: also serve calculations over a Unix socket (see evaluation_service)
+        elif argument == "--serve" or argument.startswith("--serve="):
+            from evaluation_service import default_socket_path
+            service_path = argument.split("=", 1)[1] if "=" in argument else default_socket_path()
+    app = application_class(profile, result_cache_size, service_path)
+    app.run(None)
@@ -1,33 +1,39 @@
+import time
+IMPORT_START = time.perf_counter()
+
 import gi
 gi.require_version('Gtk', '3.0')
-from gi.repository import Gtk, Gio, GObject, Gdk, Pango  
-from calculator import calculate_expression
+from gi.repository import Gtk, Gdk
+from calculator_core import error_label
+from calculator_gtk import CalculatorApplicationBase, CalculatorWindowBase, HistoryWindowBase, main
+from metrics import timed
+from result_cache import RESULT_CACHE_SIZE
+from result_format import describe_result, format_result
+from style_manager import StyleManager
+
+IMPORT_END = time.perf_counter()
+
+# Drawn at the cursor when it is not at the end of the expression
+CURSOR_MARK = "▏"
 
-class CalculatorWindow(Gtk.Window):
+
+class CalculatorWindow(CalculatorWindowBase):
     
-    def __init__(self, menu_bar, history_box):
-        Gtk.Window.__init__(self, title="Kalkulator")
+    @timed("CalculatorWindow.__init__")
+    def __init__(self, application, core):
+        Gtk.ApplicationWindow.__init__(self, application=application, title="Kalkulator")
         self.set_default_size(310, 400)
         self.set_resizable(False) 
-        self.history_box = history_box
 
         self.set_name("calculator-window")
-        css_provider = Gtk.CssProvider()
-        css_provider.load_from_path("styles.css")
-
-        context = Gtk.StyleContext()
-        screen = Gdk.Screen.get_default()
-        context.add_provider_for_screen(screen, css_provider, Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION)
+        StyleManager.get_default().apply()
 
-        self.expression = ""
-        self.menu_bar = menu_bar
-
-        self.connect("destroy", self.on_window_destroy)  
+        # The calculator's state lives in the session; '=' starts a new expression
+        self.start_session(core)
 
         grid = Gtk.Grid()
         self.add(grid)
         
-        grid.attach(self.menu_bar, 0, 0, 1, 1)
         self.create_display_panel(grid)
         self.create_button_panel(grid)
         self.create_operators_panel(grid)
@@ -110,108 +116,78 @@ class CalculatorWindow(Gtk.Window):
         self.result_entry.set_property("xalign", 1) # text-align to right
         self.result_box.pack_end(self.result_entry, True, True, 0)
     
-    def on_button_clicked(self, button):
-        label = button.get_label()
-        
-        # Clean the result if the previous expression has been calculated
-        if self.expression == "" and self.result_entry.get_text() != "":
-            self.result_entry.set_text("")
-            
-        if label == '=':
-            try:
-                result = calculate_expression(self.expression)
-                self.result_entry.set_text("=" + str(result))
-                self.history_box.add_to_history(f"{self.expression}={result}")  
-                self.expression = ""
-            except Exception as e:
-                self.show_error_dialog(str(e))
-                self.result_entry.set_text("")  
-                self.expression = ""
-                self.expression_entry.set_text(self.expression)
-        else:
-            if label == '←':
-                self.expression = self.expression[:-1]
-                self.expression_entry.set_text(self.expression)
-                if self.expression == "":
-                    self.result_entry.set_text("")
-            else:
-                self.expression += label
-    
-            self.expression_entry.set_text(self.expression)
-    
-    def show_error_dialog(self, message):
-        dialog = Gtk.MessageDialog(
-            transient_for=self,
-            modal=True,
-            message_type=Gtk.MessageType.ERROR,
-            buttons=Gtk.ButtonsType.OK,
-            text=message
-        )
-        dialog.connect("response", self.on_dialog_response)
-        dialog.run()
-        dialog.destroy()
-
-    def on_dialog_response(self, dialog, _):
-        dialog.destroy()
-        
-    def on_window_destroy(self, window):
-        window.destroy()
-
-
-class HistoryBox(GObject.GObject):    
-    __gsignals__ = {
-        'history-updated': (GObject.SIGNAL_RUN_FIRST, None, ())
-    }
-
-    def __init__(self):
-        GObject.GObject.__init__(self)
-        self.history_of_calculations = []
-
-    def add_to_history(self, calculation):
-        self.history_of_calculations.append(calculation)
-        self.emit('history-updated')
-
-    def get_history(self):
-        return self.history_of_calculations
-
-class HistoryWindow(Gtk.Window):
-    def __init__(self, menu_bar, history_box):
-        Gtk.Window.__init__(self, title="Historia Obliczeń")
+    # The session's view: shows what the session tells it to
+
+    def show_expression(self, expression, cursor):
+        # Only the part around the cursor; the cursor is marked unless it is at the end
+        if cursor < len(expression):
+            expression = expression[:cursor] + CURSOR_MARK + expression[cursor:]
+        self.expression_entry.set_text(expression)
+
+    def show_preview(self, preview):
+        self.clear_error()
+        self.result_entry.set_text("" if preview is None else format_result(preview))
+        self.result_entry.set_tooltip_text(None if preview is None else describe_result(preview))
+
+    def show_pending(self):
+        self.clear_error()
+        self.result_entry.set_text("…")
+        self.result_entry.set_tooltip_text(None)
+
+    def show_result(self, result):
+        # A huge result in scientific notation, its length in the tooltip; Ctrl+C copies all of it
+        self.clear_error()
+        self.result_entry.set_text("=" + format_result(result))
+        self.result_entry.set_tooltip_text(describe_result(result))
+
+    def show_error(self, error):
+        # Shown in the result line (styled by the "error" class) instead of a
+        # dialog, so input goes on without waiting for anyone to dismiss it
+        self.result_entry.get_style_context().add_class("error")
+        self.result_entry.set_text(error_label(error))
+        self.result_entry.set_tooltip_text(str(error))
+
+    def clear_error(self):
+        context = self.result_entry.get_style_context()
+        if context.has_class("error"):
+            context.remove_class("error")
+            self.result_entry.set_tooltip_text(None)
+
+
+class HistoryWindow(HistoryWindowBase):
+    @timed("HistoryWindow.__init__")
+    def __init__(self, application, history_box):
+        Gtk.ApplicationWindow.__init__(self, application=application, title="Historia Obliczeń")
         
         self.set_default_size(370, 400)
         self.set_resizable(False) 
         self.set_name("history-window")  
 
-        css_provider = Gtk.CssProvider()
-        css_provider.load_from_path("styles.css")
-        context = Gtk.StyleContext()
-        screen = Gdk.Screen.get_default()
-        context.add_provider_for_screen(screen, css_provider, Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION)
+        StyleManager.get_default().apply()
 
-        self.history_box = history_box
-        self.menu_bar = menu_bar
-        self.connect("destroy", self.on_window_destroy) 
-        
         vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
         self.add(vbox)
         vbox.set_name("history-box")
 
-        vbox.pack_start(self.menu_bar, False, False, 0)
+        # Filters the history as the user types
+        search_entry = Gtk.SearchEntry()
+        search_entry.set_name("history-search")
+        search_entry.set_placeholder_text("Szukaj: 2+3, =5, >100, 10..20")
+        vbox.pack_start(search_entry, False, False, 0)
 
         scrolled_window = Gtk.ScrolledWindow()
         scrolled_window.set_policy(Gtk.PolicyType.AUTOMATIC, Gtk.PolicyType.AUTOMATIC)
         vbox.pack_start(scrolled_window, True, True, 0)
         
-        self.textview = Gtk.TextView()
-        self.textview.set_editable(False)
-        self.textview.set_cursor_visible(False)
-        self.textview.override_background_color(Gtk.StateFlags.NORMAL, Gdk.RGBA(23/255, 24/255, 26/255, 1))
-        self.textview.override_color(Gtk.StateFlags.NORMAL, Gdk.RGBA(1, 1, 1, 1))
-        self.textview.set_name("history-text")
-        scrolled_window.add(self.textview)
-        
-        self.history_box.connect('history-updated', self.update_history_list)
-        self.update_history_list()
+        textview = Gtk.TextView()
+        textview.set_editable(False)
+        textview.set_cursor_visible(False)
+        textview.override_background_color(Gtk.StateFlags.NORMAL, Gdk.RGBA(23/255, 24/255, 26/255, 1))
+        textview.override_color(Gtk.StateFlags.NORMAL, Gdk.RGBA(1, 1, 1, 1))
+        textview.set_name("history-text")
+        scrolled_window.add(textview)
+
+        self.connect_history(history_box, search_entry, textview)
 
         clear_button = Gtk.Button(label="Wyczyść historię")
         clear_button.set_name("clear-history-button")
@@ -219,38 +195,23 @@ class HistoryWindow(Gtk.Window):
         clear_button.set_name("clear-history-button")
         vbox.pack_end(clear_button, False, False, 0)
     
-    def update_history_list(self, *_):
-        history_text = "\n".join(self.history_box.get_history())
-        buffer = self.textview.get_buffer()
-        buffer.set_text(history_text)
-    
-    def on_window_destroy(self, window):
-        window.destroy()
-
     def on_clear_button_clicked(self, button):
-        self.history_box.history_of_calculations = []
-        self.history_box.emit('history-updated')
+        self.history_box.clear_history()
 
-class AboutWindow(Gtk.Window):
-    def __init__(self, menu_bar):
-        Gtk.Window.__init__(self, title="O programie")
+class AboutWindow(Gtk.ApplicationWindow):
+    @timed("AboutWindow.__init__")
+    def __init__(self, application):
+        Gtk.ApplicationWindow.__init__(self, application=application, title="O programie")
         self.set_default_size(400, 200)
         self.set_resizable(False) 
         self.set_name("about-window")  
 
-        css_provider = Gtk.CssProvider()
-        css_provider.load_from_path("styles.css")
-        context = Gtk.StyleContext()
-        screen = Gdk.Screen.get_default()
-        context.add_provider_for_screen(screen, css_provider, Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION)
+        StyleManager.get_default().apply()
 
-        self.menu_bar = menu_bar
         vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
         self.add(vbox)
         vbox.set_name("about-box")
 
-        vbox.pack_start(self.menu_bar, False, False, 0)
-
         label = Gtk.Label()
         label.set_markup("<span size='large'><b>Autor:</b></span> Krystian Jandy s184589\n\n<span size='large'><b>Wersja aplikacji:</b></span> 1.0\n\n<span size='large'><b>Opis:</b></span>\nAplikacja kalkulatora jest narzędziem umożliwiającym wygodne wykonywanie podstawowych operacji matematycznych, takich jak dodawanie, odejmowanie, mnożenie i dzielenie, za pomocą prostego i intuicyjnego interfejsu graficznego użytkownika. Oprócz podstawowych funkcji matematycznych, aplikacja umożliwia również przeglądanie historii wykonanych działań, pozwalając użytkownikowi śledzić i analizować poprzednie obliczenia.")
         label.set_line_wrap(True)
@@ -264,86 +225,30 @@ class AboutWindow(Gtk.Window):
         vbox.pack_end(close_button, False, False, 0)
     
     def on_close_button_clicked(self, button):
-        self.destroy()
-
+        self.close()
 
-class CalculatorApplication(Gtk.Application):
-    def __init__(self):
-        super().__init__(application_id="com.example.calculator", flags=Gio.ApplicationFlags.FLAGS_NONE)
-        
-        self.history_box = HistoryBox()
-        css_provider = Gtk.CssProvider()
-        css_provider.load_from_path("styles.css")
-        context = Gtk.StyleContext()
-        screen = Gdk.Screen.get_default()
-        context.add_provider_for_screen(screen, css_provider, Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION)
-        self.connect("activate", self.on_activate)
-        
-    def on_activate(self, _):
-        win = CalculatorWindow(self.build_menu_bar(), self.history_box)
-        win.show_all()
 
-        
-    def build_menu_bar(self):
-        menu_bar = Gtk.MenuBar()
-        menu_bar.set_name("menu-bar")  # Dodanie identyfikatora dla menu
-
-        # Sekcja Aplikacja
-        menu_application = Gtk.Menu()
-        application_menu_item = Gtk.MenuItem(label="Aplikacja")
-        application_menu_item.set_submenu(menu_application)
-        application_menu_item.set_name("menu-item")  
-
-        # Kalkulator w sekcji Aplikacja
-        calculator_item = Gtk.MenuItem(label="Kalkulator")
-        calculator_item.connect("activate", self.on_calculator_clicked)
-        calculator_item.set_name("menu-item")  
-        menu_application.append(calculator_item)
-
-        history_item = Gtk.MenuItem(label="Historia")
-        history_item.connect("activate", self.on_history_clicked)
-        history_item.set_name("menu-item")  
-        menu_application.append(history_item)
-        
-        # Dodanie kreski oddzielającej
-        separator = Gtk.SeparatorMenuItem()
-        menu_application.append(separator)
+class CalculatorApplication(CalculatorApplicationBase):
+    DEFERRED_WINDOWS = ("history", "about")
 
-        # Dodanie opcji "Wyjście" w sekcji "Aplikacja"
-        quit_item = Gtk.MenuItem(label="Wyjście")
-        quit_item.connect("activate", self.on_quit_activate)
-        quit_item.set_name("menu-item")  
-        menu_application.append(quit_item)
+    def __init__(self, profile=None, result_cache_size=RESULT_CACHE_SIZE, service_path=None):
+        super().__init__(profile, result_cache_size, service_path)
+        self.window_factories = {
+            "calculator": lambda: CalculatorWindow(self, self.core),
+            "history": lambda: HistoryWindow(self, self.history_box),
+            "about": lambda: AboutWindow(self),
+        }
 
-        menu_bar.append(application_menu_item)
+    def get_actions(self):
+        return super().get_actions() + [("about", self.on_about_program_clicked)]
 
+    def append_about_menu(self, menu_bar):
         # Sekcja About
-        about_menu_item = Gtk.MenuItem(label="O programie")
-        about_menu_item.connect("activate", self.on_about_program_clicked)
-        about_menu_item.set_name("menu-item")  
-        
-        menu_bar.append(about_menu_item)
-        
-        return menu_bar
-    
-    def on_calculator_clicked(self, _):
-        calculator_window = CalculatorWindow(self.build_menu_bar(), self.history_box)
-        calculator_window.show_all()
-
-    def on_history_clicked(self, _):
-        history_window = HistoryWindow(self.build_menu_bar(), self.history_box)
-        history_window.show_all()
-    
-    def on_about_program_clicked(self, x):
-        about_menu = AboutWindow(self.build_menu_bar())
-        about_menu.show_all()
+        menu_bar.append("O programie", "app.about")
 
-    def on_quit_activate(self, _):
-        Gtk.main_quit()
+    def on_about_program_clicked(self, *_):
+        self.present_window("about")
 
 
-    
 if __name__ == "__main__":
-    app = CalculatorApplication()
-    app.run(None)
-    Gtk.main()
+    main(CalculatorApplication, IMPORT_START, IMPORT_END)
@@ -0,0 +1,124 @@
+import threading
+
+from calculator import FLOAT, INTERRUPTED, CalculationError, is_slow_expression
+from evaluation_worker import POLL_INTERVAL, WorkerProcess, evaluate
+
+# Expressions up to this length that are not is_slow_expression() are cheap
+# enough to evaluate in place
+INLINE_LIMIT = 256
+
+
+class EvaluationScheduler:
+    # Runs calculations in a worker process and hands (value, error) to the
+    # callback through `post` (GLib.idle_add in the GUI), so the main loop
+    # never waits for them; the error is a CalculationError. Every submit supersedes the previous request: a
+    # stale calculation still running is stopped by terminating the worker.
+    # With a ResultCache, repeated calculations are answered from it.
+
+    def __init__(self, post, inline_limit=INLINE_LIMIT, mode=FLOAT, cache=None):
+        self.post = post
+        self.inline_limit = inline_limit
+        self.mode = mode
+        self.cache = cache
+        self._condition = threading.Condition()
+        self._generation = 0
+        self._request = None
+        self._closed = False
+        self._running = None
+        self._thread = None
+        self._worker_lock = threading.Lock()
+        self._worker = None
+
+    @property
+    def pending(self):
+        return self._request is not None or self._running is not None
+
+    def submit(self, expression, callback):
+        mode = self.mode
+        cached = None if self.cache is None else self.cache.get(expression, mode)
+        with self._condition:
+            self._generation += 1
+            generation = self._generation
+            if cached is not None or len(expression) <= self.inline_limit and not is_slow_expression(expression, mode):
+                # Cached or cheap: answered in place, which still supersedes any stale request
+                self._request = None
+            else:
+                self._request = (generation, expression, mode, callback)
+                self._start_thread()
+                self._condition.notify()
+                return generation
+        if cached is not None:
+            callback(cached, None)
+        else:
+            self._finish(expression, mode, callback, evaluate(expression, mode))
+        return generation
+
+    def cancel(self):
+        with self._condition:
+            self._generation += 1
+            self._request = None
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._generation += 1
+            self._request = None
+            self._condition.notify()
+        self._stop_worker()
+
+    def _start_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="evaluation-scheduler", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._request is None and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                self._running, self._request = self._request, None
+            generation, expression, mode, callback = self._running
+            outcome = self._evaluate_in_worker(generation, expression, mode)
+            self._running = None
+            if outcome is not None and generation == self._generation:
+                self.post(self._deliver, generation, expression, mode, callback, outcome)
+
+    def _deliver(self, generation, expression, mode, callback, outcome):
+        # Main thread; a newer request may have arrived since the result was posted
+        if generation == self._generation:
+            self._finish(expression, mode, callback, outcome)
+        return False
+
+    def _finish(self, expression, mode, callback, outcome):
+        value, error = outcome
+        if self.cache is not None and error is None:
+            self.cache.put(expression, value, mode)
+        callback(value, error)
+
+    def _evaluate_in_worker(self, generation, expression, mode):
+        worker = self._ensure_worker()
+        try:
+            worker.send(expression, mode)
+            while not worker.connection.poll(POLL_INTERVAL):
+                if generation != self._generation:
+                    self._stop_worker()
+                    return None
+            return worker.receive()
+        except (EOFError, OSError) as e:
+            self._stop_worker()
+            return None, CalculationError("Błąd: " + (str(e) or "przerwano obliczenia."), INTERRUPTED)
+
+    def _ensure_worker(self):
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                # A process of its own, not a fork: forking a process that runs GTK threads is not safe
+                self._worker = WorkerProcess()
+            return self._worker
+
+    def _stop_worker(self):
+        with self._worker_lock:
+            worker, self._worker = self._worker, None
+        if worker is not None:
+            worker.terminate()
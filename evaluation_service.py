@@ -0,0 +1,324 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import stat
+import sys
+import tempfile
+import threading
+
+from calculator import FLOAT, INTERRUPTED, MODES, CalculationError, is_slow_expression
+from calculator_core import HistoryModel
+from evaluation_scheduler import INLINE_LIMIT
+from evaluation_worker import WORKER_ERROR, WorkerPool, evaluate
+from history_log import default_log_path
+from result_format import exact_text
+
+# One JSON object per line in both directions, answered in order:
+#   {"id": 1, "expression": "2+3", "mode": "float"}   -> {"id": 1, "result": "5"}
+#   {"id": 2, "batch": ["1/2", "1/0"]}                 -> {"id": 2, "results": [{"result": "0.5"},
+#                                                          {"error": "…", "code": "zero-division"}]}
+# "id" is echoed back as is, "mode" defaults to the service's mode. Results
+# are sent as text, the same way the calculator shows them; errors with the
+# CalculationError code, or one of the codes below.
+REQUEST_ERROR = "Błąd: Niepoprawne żądanie."
+MODE_ERROR = "Błąd: Nieznany tryb obliczeń."
+REQUEST = "request"
+MODE = "mode"
+# Longest request line, batches included
+REQUEST_LIMIT = 16 * 1024 * 1024
+# Requests read ahead of their answers per connection before reading pauses
+PIPELINE_DEPTH = 1024
+# Seconds open connections get to finish when the service stops
+CLOSE_TIMEOUT = 1.0
+# Seconds a calculation may take in a worker before it is stopped
+REQUEST_TIMEOUT = 30.0
+
+
+def default_socket_path():
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "calculator.sock")
+    return os.path.join(tempfile.gettempdir(), "calculator-%d.sock" % os.getuid())
+
+
+def _remove_stale_socket(path):
+    # A socket left by a service that is gone is removed; a live one is not
+    # taken over, and anything but a socket is never removed
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise OSError("%s exists and is not a socket" % path)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+        except ConnectionRefusedError:
+            os.unlink(path)
+            return
+    raise OSError("%s is already served by another process" % path)
+
+
+class EvaluationService:
+    # Serves calculate_expression to local processes over a Unix socket.
+    # Connections are persistent and pipelined: requests are read ahead and
+    # answered in order as their results come in. Cheap expressions are
+    # evaluated in place, the rest in a pool of worker processes. Successful
+    # calculations go to `history`; with `post` (GLib.idle_add when a GUI
+    # runs the service) they are handed to the GUI's main thread in batches.
+    # A calculation gets `timeout` seconds; those still running for a client
+    # that has stopped sending are stopped, so they do not hold the workers.
+
+    def __init__(self, history, post=None, mode=FLOAT, inline_limit=INLINE_LIMIT, workers=None,
+                 timeout=REQUEST_TIMEOUT):
+        self.history = history
+        self.post = post
+        self.mode = mode
+        self.inline_limit = inline_limit
+        self.workers = workers
+        self.timeout = timeout
+        self.connections = 0
+        self.requests = 0
+        self.error = None
+        self.ready = threading.Event()
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._pool = None
+        self._computing = set()
+        self._handlers = {}
+        self._loop = None
+        self._stopped = None
+        self._thread = None
+
+    async def serve(self, path):
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        _remove_stale_socket(path)
+        server = await asyncio.start_unix_server(self._handle, path, limit=REQUEST_LIMIT)
+        try:
+            os.chmod(path, 0o600)
+            self.ready.set()
+            await self._stopped.wait()
+        finally:
+            server.close()
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            await self._close_connections()
+
+    async def _close_connections(self):
+        # Calculations still running are abandoned, their requests answered with an error
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+        for future in self._computing:
+            if not future.done():
+                future.set_result((None, CalculationError(WORKER_ERROR, INTERRUPTED), None))
+        for writer in self._handlers.values():
+            writer.close()
+        if self._handlers:
+            await asyncio.wait(list(self._handlers), timeout=CLOSE_TIMEOUT)
+
+    def start(self, path):
+        # Serves from a background thread, e.g. next to the GTK main loop
+        self._thread = threading.Thread(target=self._run, args=(path,), name="evaluation-service", daemon=True)
+        self._thread.start()
+        self.ready.wait()
+        if self.error is not None:
+            raise self.error
+
+    def _run(self, path):
+        try:
+            asyncio.run(self.serve(path))
+        except Exception as e:
+            self.error = e
+        finally:
+            self.ready.set()
+
+    def close(self):
+        if self._loop is not None and not self._loop.is_closed():
+            try:
+                self._loop.call_soon_threadsafe(self._stopped.set)
+            except RuntimeError:
+                pass
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        self._handlers[asyncio.current_task()] = writer
+        responses = asyncio.Queue(PIPELINE_DEPTH)
+        # WorkerJobs of this connection's calculations still running
+        jobs = set()
+        sender = asyncio.create_task(self._send(responses, writer))
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Longer than REQUEST_LIMIT; the rest of the stream cannot be trusted
+                    await responses.put(self._encode({"id": None, "error": REQUEST_ERROR, "code": REQUEST}))
+                    break
+                except ConnectionError:
+                    break
+                if not line:
+                    break
+                if line.strip():
+                    await responses.put(self._respond(line, jobs))
+        finally:
+            for job in jobs:
+                job.cancel()
+            await responses.put(None)
+            await sender
+            writer.close()
+            del self._handlers[asyncio.current_task()]
+            self.connections -= 1
+
+    async def _send(self, responses, writer):
+        connected = True
+        while True:
+            response = await responses.get()
+            if response is None:
+                break
+            if not isinstance(response, bytes):
+                response = await response
+            if not connected:
+                continue
+            writer.write(response)
+            try:
+                # Flushed once per burst of pipelined requests rather than per answer
+                if responses.empty():
+                    await writer.drain()
+            except ConnectionError:
+                connected = False
+        if connected:
+            try:
+                await writer.drain()
+            except ConnectionError:
+                pass
+
+    def _respond(self, line, jobs):
+        # The encoded answer, or a future of it while workers are computing
+        self.requests += 1
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError(line)
+        except ValueError:
+            return self._encode({"id": None, "error": REQUEST_ERROR, "code": REQUEST})
+        request_id = request.get("id")
+        mode = request.get("mode", self.mode)
+        batch = "batch" in request
+        expressions = request["batch"] if batch else [request.get("expression")]
+        if not isinstance(expressions, list) or not all(isinstance(expression, str) for expression in expressions):
+            return self._encode({"id": request_id, "error": REQUEST_ERROR, "code": REQUEST})
+        if mode not in MODES:
+            return self._encode({"id": request_id, "error": MODE_ERROR, "code": MODE})
+
+        outcomes = [self._submit(expression, mode, jobs) for expression in expressions]
+        if any(isinstance(outcome, asyncio.Future) for outcome in outcomes):
+            return asyncio.ensure_future(self._reply_later(request_id, batch, mode, expressions, outcomes))
+        return self._reply(request_id, batch, mode, expressions, outcomes)
+
+    def _submit(self, expression, mode, jobs):
+        # (value, error, text of the value), or a future of it. The text of a
+        # long result is worked out by the worker, off the event loop.
+        if len(expression) <= self.inline_limit and not is_slow_expression(expression, mode):
+            value, error = evaluate(expression, mode)
+            return value, error, None if error is not None else exact_text(value)
+        if self._pool is None:
+            self._pool = WorkerPool(self.workers, text=True, timeout=self.timeout)
+        future = self._loop.create_future()
+        self._computing.add(future)
+        future.add_done_callback(self._computing.discard)
+
+        def done(outcome):
+            self._loop.call_soon_threadsafe(self._resolve, future, outcome)
+
+        job = self._pool.evaluate_async(expression, mode, done)
+        jobs.add(job)
+        future.add_done_callback(lambda _: jobs.discard(job))
+        return future
+
+    def _resolve(self, future, outcome):
+        if not future.done():
+            future.set_result(outcome)
+
+    async def _reply_later(self, request_id, batch, mode, expressions, outcomes):
+        finished = []
+        for outcome in outcomes:
+            if isinstance(outcome, asyncio.Future):
+                outcome = await outcome
+            finished.append(outcome)
+        return self._reply(request_id, batch, mode, expressions, finished)
+
+    def _reply(self, request_id, batch, mode, expressions, outcomes):
+        self._record([(expression, value, None, mode) for expression, (value, error, _) in zip(expressions, outcomes)
+                      if error is None])
+        results = [{"result": text} if error is None else {"error": str(error), "code": error.code}
+                   for _, error, text in outcomes]
+        if batch:
+            return self._encode({"id": request_id, "results": results})
+        return self._encode(dict(id=request_id, **results[0]))
+
+    def _encode(self, response):
+        return (json.dumps(response, ensure_ascii=False) + "\n").encode("utf-8")
+
+    def _record(self, calculations):
+        if not calculations:
+            return
+        if self.post is None:
+            self.history.extend_history(calculations)
+            return
+        with self._pending_lock:
+            schedule = not self._pending
+            self._pending += calculations
+        if schedule:
+            self.post(self._flush_history)
+
+    def _flush_history(self):
+        # On the GUI's main thread; everything recorded since the last flush is added at once
+        with self._pending_lock:
+            calculations, self._pending = self._pending, []
+        self.history.extend_history(calculations)
+        return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Kalkulator jako usługa na gniazdzie Unix, bez GTK.")
+    parser.add_argument("--socket", default=default_socket_path(), help="ścieżka gniazda")
+    parser.add_argument("--mode", choices=MODES, default=FLOAT, help="domyślny tryb obliczeń")
+    parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT,
+                        help="najdłuższy czas jednego obliczenia w sekundach")
+    # No log by default: the GUI's log must not have a second writer, so a
+    # service sharing history with the GUI is started with the GUI's --serve
+    parser.add_argument("--log", metavar="PATH", help="zapisuj obliczenia w historii w tym pliku")
+    args = parser.parse_args(argv)
+    if args.log is not None and os.path.abspath(args.log) == os.path.abspath(default_log_path()):
+        parser.error("historię kalkulatora zapisuje już okno kalkulatora; uruchom je z --serve")
+
+    history = HistoryModel(log_path=args.log)
+    service = EvaluationService(history, mode=args.mode, timeout=args.timeout)
+
+    async def serve():
+        # SIGTERM stops the service the same way as Ctrl+C, removing the socket
+        serving = asyncio.ensure_future(service.serve(args.socket))
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, serving.cancel)
+        await serving
+
+    try:
+        asyncio.run(serve())
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    finally:
+        history.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Connection
+
+from calculator import FLOAT, INTERRUPTED, CalculationError, calculate_expression
+from metrics import METRICS_ENV, observe
+from result_format import exact_text
+
+# Worker processes run this file as a script, `python evaluation_worker.py FD`,
+# so that they import only the calculator. multiprocessing's spawn would run
+# the parent's __main__ module, i.e. the GTK front end, again in every worker.
+# Workers time their calculations and send the timings back with the
+# results; they have no metrics target of their own.
+
+WORKER_ERROR = "Błąd: przerwano obliczenia."
+TIMEOUT_ERROR = "Błąd: przekroczono czas obliczeń."
+# How often a thread waiting for a worker checks whether to stop it
+POLL_INTERVAL = 0.02
+
+
+def evaluate(expression, mode=FLOAT):
+    # (value, None), or (None, CalculationError)
+    try:
+        return calculate_expression(expression, mode), None
+    except CalculationError as e:
+        return None, e
+
+
+class WorkerProcess:
+    # One worker process; a calculation is sent with send() and its outcome
+    # read back with receive(): (value, error), with `text` (value, error,
+    # exact_text(value)), the text worked out in the worker since it may take
+    # seconds for a long number. `connection` can be polled in between.
+
+    def __init__(self):
+        parent_socket, child_socket = socket.socketpair()
+        environment = {name: value for name, value in os.environ.items() if name != METRICS_ENV}
+        with child_socket:
+            self.process = subprocess.Popen([sys.executable, os.path.abspath(__file__), str(child_socket.fileno())],
+                                            pass_fds=(child_socket.fileno(),), env=environment)
+        self.connection = Connection(parent_socket.detach())
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def send(self, expression, mode, text=False):
+        self.connection.send((expression, mode, text))
+
+    def receive(self):
+        # EOFError or OSError if the worker died; the worker's timing goes to
+        # this process's metrics
+        outcome, seconds = self.connection.recv()
+        error = outcome[1]
+        observe("calculate_expression", seconds, None if error is None else str(error) or type(error).__name__)
+        return outcome
+
+    def terminate(self):
+        self.process.terminate()
+        self.process.wait()
+        self.connection.close()
+
+
+class WorkerJob:
+    # A calculation handed to a WorkerPool; cancel() drops it if it is still
+    # waiting for a worker, or stops the worker calculating it
+
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class WorkerPool:
+    # Up to `size` worker processes (one per CPU by default), started as
+    # needed and kept for the next calculations. The callback gets the
+    # outcome, as from WorkerProcess.receive, on one of the pool's threads.
+    # A calculation that runs longer than `timeout` seconds, is cancelled,
+    # or whose worker dies or is terminated, answers with an INTERRUPTED
+    # error; its worker is not reused.
+
+    def __init__(self, size=None, text=False, timeout=None):
+        self.size = size or os.cpu_count() or 1
+        self.text = text
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(self.size, thread_name_prefix="evaluation-worker")
+        self._lock = threading.Lock()
+        self._idle = []
+        self._busy = set()
+        self._closed = False
+
+    def evaluate_async(self, expression, mode, callback):
+        # Returns the WorkerJob
+        job = WorkerJob()
+        self._executor.submit(self._evaluate, job, expression, mode, callback)
+        return job
+
+    def _evaluate(self, job, expression, mode, callback):
+        callback(self._evaluate_in_worker(job, expression, mode))
+
+    def _interrupted(self, message):
+        error = CalculationError(message, INTERRUPTED)
+        return (None, error, None) if self.text else (None, error)
+
+    def _evaluate_in_worker(self, job, expression, mode):
+        if job.cancelled:
+            return self._interrupted(WORKER_ERROR)
+        with self._lock:
+            worker = self._idle.pop() if self._idle else None
+        if worker is None:
+            worker = WorkerProcess()
+        with self._lock:
+            closed = self._closed
+            if not closed:
+                self._busy.add(worker)
+        try:
+            if closed:
+                raise OSError("the pool has been terminated")
+            outcome = self._wait(worker, job, expression, mode)
+        except (EOFError, OSError):
+            outcome = None
+        if outcome is None:
+            with self._lock:
+                self._busy.discard(worker)
+            worker.terminate()
+            return self._interrupted(WORKER_ERROR if job.cancelled or self._closed else TIMEOUT_ERROR)
+        with self._lock:
+            self._busy.discard(worker)
+            if not self._closed:
+                self._idle.append(worker)
+                return outcome
+        worker.terminate()
+        return outcome
+
+    def _wait(self, worker, job, expression, mode):
+        # The outcome, or None once the job is cancelled or out of time
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        worker.send(expression, mode, self.text)
+        while not worker.connection.poll(POLL_INTERVAL):
+            if job.cancelled or deadline is not None and time.monotonic() >= deadline:
+                return None
+        return worker.receive()
+
+    def terminate(self):
+        # Workers still calculating are killed; their threads then answer with
+        # an error and close the connections
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            busy = list(self._busy)
+        for worker in idle:
+            worker.terminate()
+        for worker in busy:
+            worker.process.terminate()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def main(argv):
+    connection = Connection(int(argv[1]))
+    while True:
+        try:
+            expression, mode, text = connection.recv()
+        except EOFError:
+            return 0
+        start = time.perf_counter()
+        outcome = evaluate(expression, mode)
+        seconds = time.perf_counter() - start
+        if text:
+            value, error = outcome
+            outcome = value, error, None if error is not None else exact_text(value)
+        connection.send((outcome, seconds))
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
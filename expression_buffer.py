@@ -0,0 +1,104 @@
+class ExpressionBuffer:
+    # The expression being typed, with a cursor. A gap buffer: the characters
+    # in front of the cursor, and those after it in reverse order, so that
+    # typing and deleting at the cursor are O(1) and moving the cursor costs
+    # the distance moved. Every change is kept as (position, removed,
+    # inserted), holding only the characters it changed, so undo and redo
+    # go back and forth without limit and never copy the rest of the text.
+
+    def __init__(self, text=""):
+        self._before = list(text)
+        self._after = []
+        self._undo = []
+        self._redo = []
+
+    def __len__(self):
+        return len(self._before) + len(self._after)
+
+    @property
+    def text(self):
+        return "".join(self._before) + "".join(reversed(self._after))
+
+    @property
+    def cursor(self):
+        return len(self._before)
+
+    @property
+    def tail_length(self):
+        # Characters after the cursor
+        return len(self._after)
+
+    def move_cursor(self, position):
+        position = max(0, min(position, len(self)))
+        before, after = self._before, self._after
+        if position < len(before):
+            after.extend(reversed(before[position:]))
+            del before[position:]
+        elif position > len(before):
+            moved = len(after) - (position - len(before))
+            before.extend(reversed(after[moved:]))
+            del after[moved:]
+
+    def insert(self, text):
+        # At the cursor, which ends up after the inserted text
+        return self._record(self._replace(self.cursor, "", text))
+
+    def delete_backward(self, count=1):
+        count = min(count, len(self._before))
+        removed = "".join(self._before[len(self._before) - count:])
+        return self._record(self._replace(self.cursor - count, removed, ""))
+
+    def delete_forward(self, count=1):
+        count = min(count, len(self._after))
+        removed = "".join(reversed(self._after[len(self._after) - count:]))
+        return self._record(self._replace(self.cursor, removed, ""))
+
+    def set_text(self, text):
+        # Replaces all of the text, as one change that can be undone
+        return self._record(self._replace(0, self.text, text))
+
+    def undo(self):
+        # Returns the change made to the text, like the editing methods, or
+        # None if there is nothing to undo
+        if not self._undo:
+            return None
+        position, removed, inserted = self._undo.pop()
+        self._redo.append((position, removed, inserted))
+        return self._replace(position, inserted, removed)
+
+    def redo(self):
+        if not self._redo:
+            return None
+        position, removed, inserted = self._redo.pop()
+        self._undo.append((position, removed, inserted))
+        return self._replace(position, removed, inserted)
+
+    def window(self, width):
+        # At most `width` characters to draw: the end of the text, or the
+        # part around the cursor when it is further back; cut off parts are
+        # marked with '…'. Returns the characters and the cursor's offset.
+        length, cursor = len(self), self.cursor
+        start = max(0, min(cursor - width // 2, length - width))
+        end = min(length, start + width)
+        text = "".join(self._before[start:]) + "".join(reversed(self._after[len(self._after) - (end - cursor):]))
+        if start > 0:
+            text = "…" + text
+            cursor += 1
+        if end < length:
+            text += "…"
+        return text, cursor - start
+
+    def _replace(self, position, removed, inserted):
+        # `removed` is the text at `position`; the cursor ends up after `inserted`
+        self.move_cursor(position)
+        del self._after[len(self._after) - len(removed):]
+        self._before.extend(inserted)
+        return position, removed, inserted
+
+    def _record(self, change):
+        position, removed, inserted = change
+        if removed == inserted:
+            return None
+        self._undo.append(change)
+        self._redo.clear()
+        return change
@@ -0,0 +1,258 @@
+import csv
+import math
+import mmap
+import shutil
+import struct
+import tempfile
+from array import array
+from decimal import Decimal
+from fractions import Fraction
+from itertools import islice
+
+from calculator import MODES
+from history_log import MODE_CODES, STORED_MODES, parse_result
+from result_format import exact_repr, exact_text, parse_int
+
+# Entries handled at a time, both when writing and when feeding an import to the history
+EXPORT_CHUNK = 65536
+IMPORT_CHUNK = 2048
+
+CSV_COLUMNS = ("expression", "result", "type", "timestamp", "mode")
+# The type column tells how to read a result back; the text of a decimal
+# result, e.g. 0.3, does not tell it from a float
+CSV_TYPES = {int: "int", float: "float", Decimal: "decimal", Fraction: "fraction"}
+# Exact results can be far longer than the csv module's default limit on a
+# field (128 KiB); the largest a C long holds everywhere
+CSV_FIELD_LIMIT = 2 ** 31 - 1
+
+# Columnar file: header, then seven columns, each starting at a multiple of
+# COLUMN_ALIGN bytes so that NumPy can map it in place:
+#   timestamp        float64[count]
+#   value            float64[count]  result as a float, NaN if it has none
+#   expression_end   int64[count]    end of each expression in expression_bytes
+#   result_end       int64[count]    end of each exact result in result_bytes
+#   mode             uint8[count]    mode as in the history log (MODE_CODES), 0 if not known
+#   expression_bytes uint8[...]      UTF-8 expressions, back to back
+#   result_bytes     uint8[...]      results as exact_repr() text
+COLUMNS_MAGIC = b"CALCCOL2"
+COLUMN_ALIGN = 64
+# magic, count, length of expression_bytes, length of result_bytes
+_COLUMNS_HEADER = struct.Struct("<8sQQQ")
+
+
+def _aligned(offset):
+    return -(-offset // COLUMN_ALIGN) * COLUMN_ALIGN
+
+
+def _layout(count, expression_length, result_length):
+    # Offsets of the seven columns, in file order
+    offsets = [_aligned(_COLUMNS_HEADER.size)]
+    for size in (8 * count, 8 * count, 8 * count, 8 * count, count, expression_length):
+        offsets.append(_aligned(offsets[-1] + size))
+    return offsets
+
+
+def _value(result):
+    try:
+        return float(result)
+    except OverflowError:
+        return math.inf if result > 0 else -math.inf
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _chunks(entries, size):
+    iterator = iter(entries)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def write_csv(entries, path):
+    # Results are written as numbers (fractions as n/d) with their type,
+    # timestamps in seconds, an unknown mode as an empty field
+    with open(path, "w", newline="", encoding="utf-8") as output:
+        writer = csv.writer(output)
+        writer.writerow(CSV_COLUMNS)
+        for chunk in _chunks(entries, EXPORT_CHUNK):
+            writer.writerows((entry.expression, exact_text(entry.result), CSV_TYPES[type(entry.result)],
+                              repr(entry.timestamp), entry.mode or "") for entry in chunk)
+
+
+def _parse_csv_result(text, result_type):
+    # The inverse of exact_text(result)
+    if result_type == "int":
+        return parse_int(text)
+    if result_type == "float":
+        return float(text)
+    if result_type == "decimal":
+        return Decimal(text)
+    if result_type == "fraction":
+        return Fraction(*map(parse_int, text.split("/")))
+    raise ValueError("unknown result type: %r" % result_type)
+
+
+def iter_csv(path):
+    # (expression, result, timestamp, mode) for every row, read as they are needed
+    csv.field_size_limit(max(csv.field_size_limit(), CSV_FIELD_LIMIT))
+    with open(path, newline="", encoding="utf-8") as source:
+        reader = csv.reader(source)
+        if tuple(next(reader, ())) != CSV_COLUMNS:
+            raise ValueError("%s is not a history export" % path)
+        for expression, result, result_type, timestamp, mode in reader:
+            if mode and mode not in MODES:
+                raise ValueError("unknown mode: %r" % mode)
+            yield expression, _parse_csv_result(result, result_type), float(timestamp), mode or None
+
+
+def write_columns(entries, path):
+    # `entries` must have a length (a HistoryStore does); every column is
+    # written a chunk at a time at its own offset, exact results are
+    # gathered in a temporary file since their offset is known only at the end
+    count = len(entries)
+    offsets = _layout(count, 0, 0)
+    positions = offsets[:6]
+    expression_length = result_length = 0
+    with open(path, "wb") as output, tempfile.TemporaryFile() as results:
+        for chunk in _chunks(entries, EXPORT_CHUNK):
+            expressions = [entry.expression.encode("utf-8") for entry in chunk]
+            exact = [exact_repr(entry.result).encode("utf-8") for entry in chunk]
+            expression_end = array("q")
+            result_end = array("q")
+            for expression, result in zip(expressions, exact):
+                expression_length += len(expression)
+                result_length += len(result)
+                expression_end.append(expression_length)
+                result_end.append(result_length)
+            columns = (
+                array("d", [entry.timestamp for entry in chunk]),
+                array("d", [_value(entry.result) for entry in chunk]),
+                expression_end,
+                result_end,
+                bytes([MODE_CODES[entry.mode] for entry in chunk]),
+                b"".join(expressions),
+            )
+            for index, column in enumerate(columns):
+                output.seek(positions[index])
+                output.write(column)
+                positions[index] = output.tell()
+            results.write(b"".join(exact))
+
+        result_offset = _layout(count, expression_length, result_length)[6]
+        output.seek(result_offset)
+        results.seek(0)
+        shutil.copyfileobj(results, output)
+        # An empty history still needs the padding its header promises
+        output.truncate(result_offset + result_length)
+        output.seek(0)
+        output.write(_COLUMNS_HEADER.pack(COLUMNS_MAGIC, count, expression_length, result_length))
+
+
+def _read_header(view, path):
+    # (count, length of expression_bytes, length of result_bytes, column offsets)
+    if len(view) < _COLUMNS_HEADER.size:
+        raise ValueError("%s is not a history export" % path)
+    magic, count, expression_length, result_length = _COLUMNS_HEADER.unpack_from(view)
+    offsets = _layout(count, expression_length, result_length)
+    if magic != COLUMNS_MAGIC or len(view) < offsets[6] + result_length:
+        raise ValueError("%s is not a history export" % path)
+    return count, expression_length, result_length, offsets
+
+
+def read_columns(path):
+    # The columns as read-only NumPy arrays mapped from the file; the
+    # expressions and exact results are byte arrays cut by their *_end offsets
+    import numpy as np
+
+    mapped = np.memmap(path, mode="r")
+    count, expression_length, result_length, offsets = _read_header(mapped, path)
+    return {
+        "timestamp": mapped[offsets[0]:offsets[0] + 8 * count].view(np.float64),
+        "value": mapped[offsets[1]:offsets[1] + 8 * count].view(np.float64),
+        "expression_end": mapped[offsets[2]:offsets[2] + 8 * count].view(np.int64),
+        "result_end": mapped[offsets[3]:offsets[3] + 8 * count].view(np.int64),
+        "mode": mapped[offsets[4]:offsets[4] + count],
+        "expression_bytes": mapped[offsets[5]:offsets[5] + expression_length],
+        "result_bytes": mapped[offsets[6]:offsets[6] + result_length],
+    }
+
+
+def iter_columns(path, last=None):
+    # (expression, result, timestamp, mode) for every entry, or the `last` ones,
+    # decoded as they are needed; skipping costs nothing in this format
+    with open(path, "rb") as source, mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as view:
+        count, _, _, offsets = _read_header(view, path)
+        first = 0 if last is None else max(0, count - last)
+        with memoryview(view) as columns, \
+                columns[offsets[0]:offsets[0] + 8 * count].cast("d") as timestamps, \
+                columns[offsets[2]:offsets[2] + 8 * count].cast("q") as expression_end, \
+                columns[offsets[3]:offsets[3] + 8 * count].cast("q") as result_end:
+            expression_start = expression_end[first - 1] if first else 0
+            result_start = result_end[first - 1] if first else 0
+            for index in range(first, count):
+                expression = view[offsets[5] + expression_start:offsets[5] + expression_end[index]]
+                result = view[offsets[6] + result_start:offsets[6] + result_end[index]]
+                yield (expression.decode("utf-8"), parse_result(result.decode("utf-8")), timestamps[index],
+                       STORED_MODES[view[offsets[4] + index]])
+                expression_start, result_start = expression_end[index], result_end[index]
+
+
+def is_csv_path(path):
+    return path.lower().endswith(".csv")
+
+
+def export_history(entries, path):
+    # CSV for a .csv path, the columnar format otherwise
+    if is_csv_path(path):
+        write_csv(entries, path)
+    else:
+        write_columns(entries, path)
+
+
+def import_history(path, last=None):
+    # With `last` set to the history's capacity, a columnar import skips the
+    # entries that would only be evicted again; a CSV file is read through
+    if is_csv_path(path):
+        return iter_csv(path)
+    return iter_columns(path, last)
+
+
+class HistoryImport:
+    # Feeds imported calculations to a HistoryModel a chunk at a time, so
+    # the history view fills in as the file is read. step() returns True
+    # while there is more to do, so it can run as a GLib idle callback;
+    # `done` gets None, or the error that stopped the import (a file that
+    # cannot be read or a malformed entry, e.g. the result 1/0).
+    # Imported timestamps older than the newest entry are moved up to it.
+
+    def __init__(self, history, calculations, done=None, chunk=IMPORT_CHUNK):
+        self.history = history
+        self.calculations = iter(calculations)
+        self.done = done
+        self.chunk = chunk
+        self.imported = 0
+
+    def step(self):
+        try:
+            calculations = list(islice(self.calculations, self.chunk))
+        except (OSError, ValueError, ArithmeticError, csv.Error) as e:
+            self._finish(e)
+            return False
+        if calculations:
+            self.history.extend_history(calculations)
+            self.imported += len(calculations)
+        if len(calculations) < self.chunk:
+            self._finish(None)
+            return False
+        return True
+
+    def run(self):
+        while self.step():
+            pass
+
+    def _finish(self, error):
+        self.calculations = iter(())
+        if self.done is not None:
+            self.done(error)
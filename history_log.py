@@ -0,0 +1,285 @@
+import mmap
+import os
+import struct
+import threading
+from decimal import Decimal
+from fractions import Fraction
+
+from calculator import MODES
+from history_store import HistoryEntry
+from result_format import parse_int
+
+MAGIC = b"CALCHLG2"
+# Logs from before the mode was recorded; they are upgraded when opened
+LEGACY_MAGIC = b"CALCHLG1"
+# Records are fsynced at most this many seconds after they are appended
+SYNC_INTERVAL = 1.0
+# The log is compacted once it is this many times larger than the part still loaded
+COMPACT_FACTOR = 4
+
+# Record: timestamp, expression length, result length, mode | expression | result | record length.
+# The trailing length lets the log be read backwards from its end. The mode
+# is stored as its index in STORED_MODES, 0 when it is not known.
+_HEADER = struct.Struct("<dIIB")
+_LEGACY_HEADER = struct.Struct("<dII")
+_TRAILER = struct.Struct("<I")
+STORED_MODES = (None,) + MODES
+MODE_CODES = {mode: code for code, mode in enumerate(STORED_MODES)}
+# Integers and fractions are stored in binary, behind a tag byte that repr()
+# text never starts with: turning a long one into decimal digits takes
+# seconds. A fraction's numerator bytes are preceded by their length.
+_INT = b"\x00"
+_FRACTION = b"\x01"
+_NUMERATOR_LENGTH = struct.Struct("<I")
+
+
+def default_log_path():
+    data_home = os.environ.get("XDG_DATA_HOME") or os.path.join(os.path.expanduser("~"), ".local", "share")
+    return os.path.join(data_home, "calculator", "history.log")
+
+
+def parse_result(text):
+    # The inverse of exact_repr(): the exact modes give Decimal('…') and Fraction(n, d)
+    if text.startswith("Decimal("):
+        return Decimal(text[9:-2])
+    if text.startswith("Fraction("):
+        return Fraction(*map(parse_int, text[9:-1].split(",")))
+    try:
+        return parse_int(text)
+    except ValueError:
+        return float(text)
+
+
+def _int_bytes(value):
+    return value.to_bytes(value.bit_length() // 8 + 1, "little", signed=True)
+
+
+def _bytes_int(data):
+    return int.from_bytes(data, "little", signed=True)
+
+
+def encode_result(result):
+    if type(result) is int:
+        return _INT + _int_bytes(result)
+    if type(result) is Fraction:
+        numerator = _int_bytes(result.numerator)
+        return _FRACTION + _NUMERATOR_LENGTH.pack(len(numerator)) + numerator + _int_bytes(result.denominator)
+    return repr(result).encode("utf-8")
+
+
+def decode_result(data):
+    # The inverse of encode_result(); records written before integers were
+    # stored in binary hold exact_repr() text
+    tag = data[:1]
+    if tag == _INT:
+        return _bytes_int(data[1:])
+    if tag == _FRACTION:
+        (length,) = _NUMERATOR_LENGTH.unpack_from(data, 1)
+        start = 1 + _NUMERATOR_LENGTH.size
+        return Fraction(_bytes_int(data[start:start + length]), _bytes_int(data[start + length:]))
+    return parse_result(data.decode("utf-8"))
+
+
+class HistoryLog:
+    # Append-only binary log of calculations. Every record is handed to the
+    # OS right away; fsync runs on a thread of its own, once per
+    # `sync_interval` for all the records appended in it, so that appending
+    # (on the GUI's main loop) never waits for the disk. Reads go through
+    # mmap and decode only the records that are asked for.
+
+    def __init__(self, path, sync_interval=SYNC_INTERVAL):
+        self.path = path
+        self.sync_interval = sync_interval
+        self._pending = 0
+        self._syncing = False
+        self._stopping = False
+        self._condition = threading.Condition()
+        self._thread = None
+        self._open()
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "a+b")
+        size = self._size()
+        if size == 0:
+            self._file.write(MAGIC)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            return
+        self._file.seek(0)
+        magic = self._file.read(len(MAGIC))
+        if magic == LEGACY_MAGIC:
+            self._upgrade(size)
+            return
+        if magic != MAGIC:
+            self._file.close()
+            raise ValueError("%s is not a history log" % self.path)
+        self._repair(size)
+
+    def _upgrade(self, size):
+        # Rewrites a legacy log in the current format, with the mode of every
+        # calculation unknown; a torn record at its end is dropped
+        temporary_path = self.path + ".tmp"
+        with mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ) as view:
+            with open(temporary_path, "wb") as temporary:
+                temporary.write(MAGIC)
+                offset = len(MAGIC)
+                while offset + _LEGACY_HEADER.size + _TRAILER.size <= size:
+                    timestamp, expression_length, result_length = _LEGACY_HEADER.unpack_from(view, offset)
+                    length = _LEGACY_HEADER.size + expression_length + result_length + _TRAILER.size
+                    if offset + length > size:
+                        break
+                    if _TRAILER.unpack_from(view, offset + length - _TRAILER.size) != (length,):
+                        break
+                    temporary.write(_HEADER.pack(timestamp, expression_length, result_length, 0)
+                                    + view[offset + _LEGACY_HEADER.size:offset + length - _TRAILER.size]
+                                    + _TRAILER.pack(length - _LEGACY_HEADER.size + _HEADER.size))
+                    offset += length
+                temporary.flush()
+                os.fsync(temporary.fileno())
+        self._file.close()
+        os.replace(temporary_path, self.path)
+        self._open()
+
+    def _size(self):
+        return os.fstat(self._file.fileno()).st_size
+
+    def _record_end_valid(self, view, end):
+        if end - len(MAGIC) < _HEADER.size + _TRAILER.size:
+            return False
+        (length,) = _TRAILER.unpack_from(view, end - _TRAILER.size)
+        start = end - length
+        if length < _HEADER.size + _TRAILER.size or start < len(MAGIC):
+            return False
+        _, expression_length, result_length, _ = _HEADER.unpack_from(view, start)
+        return _HEADER.size + expression_length + result_length + _TRAILER.size == length
+
+    def _repair(self, size):
+        # A crash between batched fsyncs can leave a torn record at the end;
+        # only then is the log scanned forward to find the last whole record
+        if size == len(MAGIC):
+            return
+        with mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ) as view:
+            if self._record_end_valid(view, size):
+                return
+            offset = len(MAGIC)
+            while offset + _HEADER.size <= size:
+                _, expression_length, result_length, _ = _HEADER.unpack_from(view, offset)
+                length = _HEADER.size + expression_length + result_length + _TRAILER.size
+                if offset + length > size or not self._record_end_valid(view, offset + length):
+                    break
+                offset += length
+        self._file.truncate(offset)
+        os.fsync(self._file.fileno())
+
+    def append(self, entry):
+        expression = entry.expression.encode("utf-8")
+        result = encode_result(entry.result)
+        length = _HEADER.size + len(expression) + len(result) + _TRAILER.size
+        self._file.write(_HEADER.pack(entry.timestamp, len(expression), len(result), MODE_CODES[entry.mode])
+                         + expression + result + _TRAILER.pack(length))
+        self._file.flush()
+        self._schedule_sync()
+
+    def _schedule_sync(self):
+        with self._condition:
+            self._pending += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sync_loop, name="history-log-sync", daemon=True)
+                self._thread.start()
+            elif self._pending == 1:
+                self._condition.notify_all()
+
+    def _sync_loop(self):
+        # Waits for a record, then for `sync_interval` so that the records
+        # appended meanwhile go with it; fsync runs outside the lock
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopping:
+                    self._condition.wait()
+                self._condition.wait_for(lambda: self._stopping, self.sync_interval)
+                if self._stopping:
+                    return
+                if not self._pending:
+                    continue
+                self._pending = 0
+                self._syncing = True
+                fileno = self._file.fileno()
+            try:
+                os.fsync(fileno)
+            except OSError:
+                pass
+            finally:
+                with self._condition:
+                    self._syncing = False
+                    self._condition.notify_all()
+
+    def sync(self):
+        # Syncs the pending records now, in the caller's thread
+        with self._condition:
+            self._condition.wait_for(lambda: not self._syncing)
+            pending, self._pending = self._pending, 0
+        if pending:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def read_last(self, count):
+        # At most `count` entries from the end of the log, oldest first,
+        # together with the offset of the first one
+        size = self._size()
+        entries = []
+        end = size
+        if size > len(MAGIC) and count > 0:
+            with mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ) as view:
+                while end > len(MAGIC) and len(entries) < count:
+                    (length,) = _TRAILER.unpack_from(view, end - _TRAILER.size)
+                    start = end - length
+                    timestamp, expression_length, result_length, mode = _HEADER.unpack_from(view, start)
+                    offset = start + _HEADER.size
+                    expression = view[offset:offset + expression_length].decode("utf-8")
+                    offset += expression_length
+                    result = decode_result(view[offset:offset + result_length])
+                    entries.append(HistoryEntry(expression, result, timestamp, STORED_MODES[mode]))
+                    end = start
+        entries.reverse()
+        return entries, end
+
+    def load(self, count):
+        # The last `count` entries; records older than those are dropped from
+        # the file once they make up most of it
+        entries, start = self.read_last(count)
+        size = self._size()
+        if start > len(MAGIC) and size - len(MAGIC) > COMPACT_FACTOR * (size - start):
+            self.compact(start)
+        return entries
+
+    def compact(self, start):
+        # Rewrites the log without the records before offset `start`
+        self.sync()
+        size = self._size()
+        temporary_path = self.path + ".tmp"
+        with mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ) as view:
+            with open(temporary_path, "wb") as temporary:
+                temporary.write(MAGIC)
+                temporary.write(view[start:size])
+                temporary.flush()
+                os.fsync(temporary.fileno())
+        self._file.close()
+        os.replace(temporary_path, self.path)
+        self._open()
+
+    def clear(self):
+        self._file.truncate(len(MAGIC))
+        self._schedule_sync()
+
+    def close(self):
+        if not self._file.closed:
+            with self._condition:
+                self._stopping = True
+                self._condition.notify_all()
+            if self._thread is not None:
+                self._thread.join()
+            self.sync()
+            self._file.close()
@@ -0,0 +1,276 @@
+import math
+import numbers
+import time
+from array import array
+from bisect import bisect_left, insort
+from decimal import Decimal
+
+from result_format import exact_repr
+
+DEFAULT_CAPACITY = 10000
+# Expressions are indexed by their substrings of this length
+NGRAM = 3
+# Searches yield None after this many candidates, so that callers can pause
+SEARCH_STEP = 4096
+# Sorted indexes are kept in chunks of this many to twice this many items
+INDEX_CHUNK = 1000
+
+
+def _ngrams(text):
+    return {text[index:index + NGRAM] for index in range(len(text) - NGRAM + 1)}
+
+
+def _indexed_grams(text):
+    # The n-grams and every shorter substring, so that a query shorter than
+    # NGRAM is answered from its own postings
+    return {text[index:index + length] for length in range(1, NGRAM + 1) for index in range(len(text) - length + 1)}
+
+
+def _contains(postings, sequence):
+    position = bisect_left(postings, sequence)
+    return position < len(postings) and postings[position] == sequence
+
+
+def _is_orderable(result):
+    # NaN (and complex numbers) cannot go into the sorted result index
+    return isinstance(result, (numbers.Real, Decimal)) and result == result
+
+
+class _SortedIndex:
+    # Sorted list split into chunks, so that an insert or a removal shifts
+    # one chunk instead of the whole index; `_maxes` holds the last item of
+    # each chunk
+
+    def __init__(self):
+        self._chunks = []
+        self._maxes = []
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, item):
+        chunks, maxes = self._chunks, self._maxes
+        self._count += 1
+        if not chunks:
+            chunks.append([item])
+            maxes.append(item)
+            return
+        position = bisect_left(maxes, item)
+        if position == len(maxes):
+            position -= 1
+            chunk = chunks[position]
+            chunk.append(item)
+            maxes[position] = item
+        else:
+            chunk = chunks[position]
+            insort(chunk, item)
+        if len(chunk) > 2 * INDEX_CHUNK:
+            chunks[position:position + 1] = [chunk[:INDEX_CHUNK], chunk[INDEX_CHUNK:]]
+            maxes[position:position + 1] = [chunk[INDEX_CHUNK - 1], chunk[-1]]
+
+    def remove(self, item):
+        chunks, maxes = self._chunks, self._maxes
+        position = bisect_left(maxes, item)
+        chunk = chunks[position]
+        index = bisect_left(chunk, item)
+        del chunk[index]
+        self._count -= 1
+        if not chunk:
+            del chunks[position]
+            del maxes[position]
+        elif index == len(chunk):
+            maxes[position] = chunk[-1]
+
+    def iter_from(self, key):
+        # Items not less than `key`, in order
+        chunks = self._chunks
+        position = bisect_left(self._maxes, key)
+        if position == len(chunks):
+            return
+        index = bisect_left(chunks[position], key)
+        for chunk in chunks[position:]:
+            yield from chunk[index:]
+            index = 0
+
+
+class HistoryEntry:
+    # `mode` is the arithmetic mode the result was calculated in, or None
+    # when it is not known (e.g. for imported calculations)
+    __slots__ = ("expression", "result", "timestamp", "mode")
+
+    def __init__(self, expression, result, timestamp, mode=None):
+        self.expression = expression
+        self.result = result
+        self.timestamp = timestamp
+        self.mode = mode
+
+    def __repr__(self):
+        return f"HistoryEntry({self.expression!r}, {exact_repr(self.result)}, {self.timestamp!r}, {self.mode!r})"
+
+
+class HistoryStore:
+    # Ring buffer of the last `capacity` calculations, oldest first.
+    # Timestamps never decrease, so lookups by time are binary searches;
+    # a sorted (expression, sequence number) index serves prefix searches,
+    # an n-gram index (shorter substrings included) substring searches and
+    # a sorted (result, sequence number) index searches by value. The n-gram
+    # postings are sequence numbers in increasing order; evicted ones are
+    # trimmed lazily.
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.clear()
+
+    def clear(self):
+        self._entries = [None] * self.capacity
+        self._start = 0
+        self._count = 0
+        self._next_sequence = 0
+        self._expression_index = _SortedIndex()
+        self._ngram_index = {}
+        self._result_index = _SortedIndex()
+        self._evicted_since_trim = 0
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("history index out of range")
+        return self._entries[(self._start + index) % self.capacity]
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield self._entries[(self._start + index) % self.capacity]
+
+    @property
+    def first_sequence(self):
+        # Sequence number of the oldest entry still held
+        return self._next_sequence - self._count
+
+    def append(self, expression, result, timestamp=None, mode=None):
+        # Returns the entry evicted to make room, if any
+        if timestamp is None:
+            timestamp = time.time()
+        if self._count:
+            timestamp = max(timestamp, self[-1].timestamp)
+        entry = HistoryEntry(expression, result, timestamp, mode)
+
+        evicted = None
+        if self._count == self.capacity:
+            evicted = self._entries[self._start]
+            self._remove_from_index(evicted, self.first_sequence)
+            self._entries[self._start] = entry
+            self._start = (self._start + 1) % self.capacity
+        else:
+            self._entries[(self._start + self._count) % self.capacity] = entry
+            self._count += 1
+
+        sequence = self._next_sequence
+        self._expression_index.add((expression, sequence))
+        for ngram in _indexed_grams(expression):
+            postings = self._ngram_index.get(ngram)
+            if postings is None:
+                postings = self._ngram_index[ngram] = array("q")
+            postings.append(sequence)
+        if _is_orderable(result):
+            self._result_index.add((result, sequence))
+        self._next_sequence += 1
+        if evicted is not None:
+            self._evicted_since_trim += 1
+            if self._evicted_since_trim >= self.capacity:
+                self._trim_ngram_index()
+        return evicted
+
+    def _remove_from_index(self, entry, sequence):
+        self._expression_index.remove((entry.expression, sequence))
+        if _is_orderable(entry.result):
+            self._result_index.remove((entry.result, sequence))
+
+    def _trim_ngram_index(self):
+        # Drops the postings of evicted entries, once per `capacity` evictions
+        first_sequence = self.first_sequence
+        for ngram, postings in list(self._ngram_index.items()):
+            cut = bisect_left(postings, first_sequence)
+            if cut == len(postings):
+                del self._ngram_index[ngram]
+            elif cut:
+                del postings[:cut]
+        self._evicted_since_trim = 0
+
+    def index_at(self, timestamp):
+        # Index of the first entry made at or after `timestamp`
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self[middle].timestamp < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def between(self, start, end):
+        # Entries with start <= timestamp < end, oldest first
+        first = self.index_at(start)
+        last = self.index_at(end)
+        return [self[index] for index in range(first, last)]
+
+    def search_prefix(self, prefix):
+        # Entries whose expression starts with `prefix`, oldest first
+        first_sequence = self.first_sequence
+        indexes = []
+        for expression, sequence in self._expression_index.iter_from((prefix,)):
+            if not expression.startswith(prefix):
+                break
+            indexes.append(sequence - first_sequence)
+        indexes.sort()
+        return [self[index] for index in indexes]
+
+    def iter_search(self, text):
+        # Entries whose expression contains `text`, newest first. Candidates
+        # come from the rarest n-gram of `text` and are checked against the
+        # other n-grams before the expression itself; a shorter `text` has
+        # postings of its own.
+        first_sequence = self.first_sequence
+        if not text:
+            for index in range(self._count - 1, -1, -1):
+                if index % SEARCH_STEP == 0:
+                    yield None
+                yield self[index]
+            return
+        postings = []
+        for ngram in _ngrams(text) if len(text) >= NGRAM else (text,):
+            ngram_postings = self._ngram_index.get(ngram)
+            if ngram_postings is None:
+                return
+            postings.append(ngram_postings)
+        postings.sort(key=len)
+        candidates, others = postings[0], postings[1:]
+        for position in range(len(candidates) - 1, -1, -1):
+            if position % SEARCH_STEP == 0:
+                yield None
+            sequence = candidates[position]
+            if sequence < first_sequence:
+                return
+            if all(_contains(other, sequence) for other in others):
+                entry = self[sequence - first_sequence]
+                if text in entry.expression:
+                    yield entry
+
+    def iter_results(self, low=None, high=None, include_low=True, include_high=True):
+        # Entries with a numeric result between `low` and `high`, by value
+        if low is None:
+            items = self._result_index.iter_from(())
+        else:
+            items = self._result_index.iter_from((low,) if include_low else (low, math.inf))
+        end = None if high is None else (high, math.inf) if include_high else (high,)
+        first_sequence = self.first_sequence
+        for item in items:
+            if end is not None and not item < end:
+                return
+            yield self[item[1] - first_sequence]
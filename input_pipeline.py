@@ -0,0 +1,65 @@
+from calculator import ExpressionValidator
+
+# Characters typed or pasted in another form than the buttons use
+_CHARACTER_MAP = {
+    ',': '.',
+    '×': '*',
+    '÷': '/',
+    '−': '-',
+}
+
+
+class InputPipeline:
+    # Buffers typed, clicked and pasted input for the calculator window.
+    # Characters are validated as they arrive and rejected ones are dropped;
+    # the display is redrawn at most once per batch: the first change asks
+    # `schedule` (the window's frame clock) to call flush() once, and later
+    # changes before that only mark the display out of date.
+
+    def __init__(self, schedule, redraw, text=""):
+        self.schedule = schedule
+        self.redraw = redraw
+        self.validator = ExpressionValidator(text)
+        self._dirty = False
+        self._scheduled = False
+
+    def feed(self, text, tail_length=0):
+        # Returns the accepted part of `text`, to be inserted into the
+        # expression in front of the last `tail_length` characters (the
+        # text after the cursor)
+        chars = [_CHARACTER_MAP.get(char, char) for char in text if not char.isspace()]
+        accepted = self.validator.insert(chars, tail_length)
+        if accepted:
+            self.invalidate()
+        return "".join(accepted)
+
+    def replace(self, count, text, tail_length=0):
+        # For a change the window has made itself (deleted, undone, set):
+        # the `count` characters in front of the last `tail_length` became
+        # `text`; redraw is up to the caller
+        self.validator.replace(count, text, tail_length)
+
+    def reset(self, text=""):
+        # For text the window has set itself; redraw is up to the caller
+        self.validator.reset(text)
+
+    def invalidate(self):
+        self._dirty = True
+        if not self._scheduled:
+            self._scheduled = True
+            self.schedule(self._on_frame)
+
+    def _on_frame(self, *_):
+        self._scheduled = False
+        self.flush()
+        return False
+
+    def flush(self):
+        # Redraws now if anything changed since the last redraw
+        if self._dirty:
+            self._dirty = False
+            self.redraw()
+
+    def cancel(self):
+        # The pending redraw is not needed, e.g. the window shows something else
+        self._dirty = False
@@ -0,0 +1,149 @@
+import atexit
+import os
+import threading
+import time
+from functools import wraps
+
+# Where metrics go: a file path, or "unix:<path>" for a Unix socket. Read at
+# import time; when unset, `timed` hands back the undecorated function, so
+# instrumentation costs nothing.
+METRICS_ENV = "CALCULATOR_METRICS"
+DUMP_INTERVAL = 10
+# Latency histogram bucket bounds, in seconds
+BUCKETS = (1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 0.1, 1.0, 10.0)
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class _Timing:
+    __slots__ = ("buckets", "total", "calls")
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.calls = 0
+
+
+class MetricsRegistry:
+    # Call counts, latency histograms and error counts per instrumented
+    # function, rendered in the Prometheus text exposition format
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timings = {}
+        self._errors = {}
+
+    def observe(self, name, seconds, error=None):
+        with self._lock:
+            timing = self._timings.get(name)
+            if timing is None:
+                timing = self._timings[name] = _Timing()
+            timing.calls += 1
+            timing.total += seconds
+            for index, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    timing.buckets[index] += 1
+                    break
+            if error is not None:
+                key = (name, error)
+                self._errors[key] = self._errors.get(key, 0) + 1
+
+    def render(self):
+        with self._lock:
+            timings = sorted(self._timings.items())
+            errors = sorted(self._errors.items())
+            lines = [
+                "# HELP calculator_calls_total Calls of an instrumented function.",
+                "# TYPE calculator_calls_total counter",
+            ]
+            for name, timing in timings:
+                lines.append('calculator_calls_total{function="%s"} %d' % (_escape(name), timing.calls))
+            lines += [
+                "# HELP calculator_errors_total Errors raised by an instrumented function.",
+                "# TYPE calculator_errors_total counter",
+            ]
+            for (name, error), count in errors:
+                lines.append('calculator_errors_total{function="%s",error="%s"} %d'
+                             % (_escape(name), _escape(error), count))
+            lines += [
+                "# HELP calculator_latency_seconds Time spent in an instrumented function.",
+                "# TYPE calculator_latency_seconds histogram",
+            ]
+            for name, timing in timings:
+                label = _escape(name)
+                cumulative = 0
+                for bound, count in zip(BUCKETS, timing.buckets):
+                    cumulative += count
+                    lines.append('calculator_latency_seconds_bucket{function="%s",le="%r"} %d'
+                                 % (label, bound, cumulative))
+                lines.append('calculator_latency_seconds_bucket{function="%s",le="+Inf"} %d' % (label, timing.calls))
+                lines.append('calculator_latency_seconds_sum{function="%s"} %r' % (label, timing.total))
+                lines.append('calculator_latency_seconds_count{function="%s"} %d' % (label, timing.calls))
+        return "\n".join(lines) + "\n"
+
+    def dump(self, target):
+        data = self.render().encode("utf-8")
+        if target.startswith("unix:"):
+            import socket
+
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+                connection.connect(target[len("unix:"):])
+                connection.sendall(data)
+            return
+        # Written aside and renamed, so a reader never sees half a dump
+        temporary_path = target + ".tmp"
+        with open(temporary_path, "wb") as temporary:
+            temporary.write(data)
+        os.replace(temporary_path, target)
+
+
+TARGET = os.environ.get(METRICS_ENV) or None
+registry = MetricsRegistry() if TARGET is not None else None
+
+
+def metrics_enabled():
+    return registry is not None
+
+
+def timed(name):
+    # Decorator recording calls, latency and errors (by message) of a function
+    def decorate(function):
+        if registry is None:
+            return function
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            except Exception as e:
+                registry.observe(name, time.perf_counter() - start, str(e) or type(e).__name__)
+                raise
+            registry.observe(name, time.perf_counter() - start)
+            return result
+        return wrapper
+    return decorate
+
+
+def observe(name, seconds, error=None):
+    # Records a call timed elsewhere, e.g. in a worker process
+    if registry is not None:
+        registry.observe(name, seconds, error)
+
+
+def dump_metrics():
+    # Writes the metrics to the configured target; errors are not fatal.
+    # Returns True while enabled, so it can repeat as a GLib timeout.
+    if registry is None:
+        return False
+    try:
+        registry.dump(TARGET)
+    except OSError:
+        pass
+    return True
+
+
+if registry is not None:
+    atexit.register(dump_metrics)
@@ -0,0 +1,62 @@
+from collections import OrderedDict
+
+from calculator import FLOAT, normalize_expression
+
+RESULT_CACHE_SIZE = 4096
+
+class ResultCache:
+    # LRU cache of calculation results keyed on (normalized expression, mode),
+    # so "2+3" and "2 + 3" share one entry. Only successful results are kept.
+
+    def __init__(self, capacity=RESULT_CACHE_SIZE):
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._results)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, expression, mode=FLOAT):
+        # The cached result, or None
+        key = (normalize_expression(expression), mode)
+        result = self._results.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self._results.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def put(self, expression, result, mode=FLOAT):
+        if self._store((normalize_expression(expression), mode), result):
+            self.evictions += 1
+
+    def _store(self, key, result):
+        self._results[key] = result
+        self._results.move_to_end(key)
+        if len(self._results) > self.capacity:
+            self._results.popitem(last=False)
+            return True
+        return False
+
+    def seed(self, entries):
+        # Warms the cache from history entries, oldest first; entries pushed
+        # out while seeding do not count as evictions. Entries whose mode is
+        # not known are skipped: the type of a result does not tell it
+        # (a decimal result read back from a CSV export is a float).
+        for entry in entries:
+            if entry.mode is not None:
+                self._store((normalize_expression(entry.expression), entry.mode), entry.result)
+
+    def clear(self):
+        self._results.clear()
+        self.hits = self.misses = self.evictions = 0
@@ -0,0 +1,171 @@
+import decimal
+from decimal import Decimal
+from fractions import Fraction
+
+# Results up to this many characters are shown whole, longer ones in
+# scientific notation with this many significant digits
+RESULT_WIDTH = 64
+SCIENTIFIC_DIGITS = 15
+
+# Integers up to this many bits (about 3600 digits, within Python's limit
+# on int/str conversion) are converted by str() and int() directly; longer
+# ones by halves, with the decimal module's fast multiplication
+_DIRECT_BITS = 12000
+_DIRECT_DIGITS = 3600
+# Leading bits a scientific notation is worked out from, at first and at most:
+# more are taken only when the rounded digits are still undecided
+_TOP_BITS = 64
+_MAX_TOP_BITS = 4096
+_LOG10_2 = 0.30102999566398120
+
+_EXACT = decimal.Context(prec=decimal.MAX_PREC, Emax=decimal.MAX_EMAX, Emin=decimal.MIN_EMIN)
+_EXACT.traps[decimal.Inexact] = True
+
+
+def format_result(value, width=RESULT_WIDTH):
+    # The result as shown: whole if it fits in `width` characters, otherwise
+    # (long integers and fractions) in scientific notation, worked out from
+    # the leading bits of the number, so that the time taken does not grow
+    # with its length
+    whole = _whole(value, width)
+    return _scientific(value) if whole is None else whole
+
+
+def describe_result(value, width=RESULT_WIDTH):
+    # A note for a result shown in scientific notation (e.g. as a tooltip),
+    # None if it is shown whole
+    if _whole(value, width) is not None:
+        return None
+    if type(value) is Fraction:
+        return "Ułamek: licznik ok. %s cyfr, mianownik ok. %s cyfr" % (
+            group_digits(approximate_digits(value.numerator)), group_digits(approximate_digits(value.denominator)))
+    return "Liczba całkowita, ok. %s cyfr" % group_digits(approximate_digits(value))
+
+
+def _whole(value, width):
+    # str(value) if it has at most `width` characters, else None
+    if type(value) is int or type(value) is Fraction:
+        if approximate_digits(value) > width:
+            return None
+        text = str(value)
+        return text if len(text) <= width else None
+    return str(value)
+
+
+def approximate_digits(value):
+    # Decimal digits of an int (of both parts of a fraction), from its bit
+    # length; at most one too many
+    if type(value) is Fraction:
+        return approximate_digits(value.numerator) + approximate_digits(value.denominator)
+    if type(value) is int:
+        return int(abs(value).bit_length() * _LOG10_2) + 1
+    return len(str(value))
+
+
+def group_digits(number, separator="\u2009"):
+    # 1234567 as "1 234 567", with thin spaces
+    return format(number, ",").replace(",", separator)
+
+
+def exact_text(value):
+    # str(value) without Python's limit on the digits of an int; may be
+    # slow for a huge number, so it is worked out only when it is needed
+    # (copying, export, the log)
+    if type(value) is int:
+        return _int_to_text(value)
+    if type(value) is Fraction:
+        if value.denominator == 1:
+            return _int_to_text(value.numerator)
+        return "%s/%s" % (_int_to_text(value.numerator), _int_to_text(value.denominator))
+    return str(value)
+
+
+def exact_repr(value):
+    # repr(value), likewise
+    if type(value) is int:
+        return _int_to_text(value)
+    if type(value) is Fraction:
+        return "Fraction(%s, %s)" % (_int_to_text(value.numerator), _int_to_text(value.denominator))
+    return repr(value)
+
+
+def parse_int(text):
+    # int(text) without Python's limit on the digits
+    if len(text) <= _DIRECT_DIGITS:
+        return int(text)
+    text = text.strip()
+    if text[:1] in "+-":
+        value = parse_int(text[1:])
+        return -value if text[0] == "-" else value
+    if not text.isdigit():
+        raise ValueError("invalid literal for int(): %r" % text[:20])
+    powers = {}
+
+    def parse(start, end):
+        if end - start <= _DIRECT_DIGITS:
+            return int(text[start:end])
+        middle = (start + end + 1) // 2
+        power = powers.get(end - middle)
+        if power is None:
+            power = powers[end - middle] = 10 ** (end - middle)
+        return parse(start, middle) * power + parse(middle, end)
+
+    return parse(0, len(text))
+
+
+def _int_to_text(value):
+    if value.bit_length() <= _DIRECT_BITS:
+        return str(value)
+    if value < 0:
+        return "-" + _int_to_text(-value)
+    powers = {}
+
+    def convert(value, bits):
+        # The halves are put together as decimals, exactly
+        if bits <= _DIRECT_BITS:
+            return Decimal(value)
+        low_bits = bits >> 1
+        high = value >> low_bits
+        power = powers.get(low_bits)
+        if power is None:
+            power = powers[low_bits] = _EXACT.power(2, low_bits)
+        return _EXACT.fma(convert(high, bits - low_bits), power, convert(value - (high << low_bits), low_bits))
+
+    return str(convert(value, value.bit_length()))
+
+
+def _bounds(value, bits, context):
+    # Decimals a little below and above a positive int, from its top `bits` bits
+    shift = max(value.bit_length() - bits, 0)
+    top = value >> shift
+    if not shift:
+        exact = context.plus(Decimal(top))
+        return exact, exact
+    power = context.power(2, shift)
+    margin = context.add(1, context.power(10, 5 - context.prec))
+    return (context.divide(context.multiply(top, power), margin),
+            context.multiply(context.multiply(top + 1, power), margin))
+
+
+def _scientific(value, digits=SCIENTIFIC_DIGITS):
+    # Rounded to `digits` significant digits. The bounds are worked out with
+    # more leading bits until both round the same way; past _MAX_TOP_BITS
+    # the last digit may be one off.
+    numerator, denominator = (value.numerator, value.denominator) if type(value) is Fraction else (value, 1)
+    rounding = decimal.Context(prec=digits, Emax=decimal.MAX_EMAX, Emin=decimal.MIN_EMIN)
+    bits = _TOP_BITS
+    while True:
+        context = decimal.Context(prec=digits + 10 + int(bits * _LOG10_2), Emax=decimal.MAX_EMAX,
+                                  Emin=decimal.MIN_EMIN)
+        low, high = _bounds(abs(numerator), bits, context)
+        if denominator != 1:
+            denominator_low, denominator_high = _bounds(denominator, bits, context)
+            margin = context.add(1, context.power(10, 5 - context.prec))
+            low = context.divide(context.divide(low, denominator_high), margin)
+            high = context.multiply(context.divide(high, denominator_low), margin)
+        low, high = rounding.plus(low), rounding.plus(high)
+        if low == high or bits >= _MAX_TOP_BITS:
+            break
+        bits *= 4
+    text = "{:e}".format(rounding.normalize(low))
+    return "-" + text if numerator < 0 else text
@@ -0,0 +1,22 @@
+import sys
+import time
+
+
+class StartupProfile:
+    # Wall-clock time of each startup phase, measured from `start`
+
+    def __init__(self, start=None):
+        self.start = time.perf_counter() if start is None else start
+        self.phases = []
+        self._last = self.start
+
+    def mark(self, phase, at=None):
+        now = time.perf_counter() if at is None else at
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def report(self, file=sys.stderr):
+        print("Profil uruchamiania:", file=file)
+        for phase, duration in self.phases:
+            print("  %-28s %8.1f ms" % (phase, duration * 1e3), file=file)
+        print("  %-28s %8.1f ms" % ("razem", (self._last - self.start) * 1e3), file=file)
@@ -0,0 +1,39 @@
+import os
+
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import Gtk, Gdk
+
+STYLESHEET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "styles.css")
+
+
+class StyleManager:
+    # One CssProvider per process: the stylesheet is parsed and registered
+    # on the screen once, and parsed again only when the file has changed
+
+    _default = None
+
+    def __init__(self, path=STYLESHEET_PATH):
+        self.path = path
+        self.provider = None
+        self.registrations = 0
+        self._mtime = None
+
+    @classmethod
+    def get_default(cls):
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    def apply(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        if self.provider is None:
+            self.provider = Gtk.CssProvider()
+            self.provider.load_from_path(self.path)
+            screen = Gdk.Screen.get_default()
+            Gtk.StyleContext.add_provider_for_screen(screen, self.provider, Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION)
+            self.registrations += 1
+        elif mtime != self._mtime:
+            # Reloading the registered provider restyles every widget in place
+            self.provider.load_from_path(self.path)
+        self._mtime = mtime
@@ -0,0 +1,78 @@
+import types
+import weakref
+
+
+class Subscription:
+    # One callback subscribed to a Subscribers list. A bound method is held
+    # through a weak reference, so a subscribed window can still be garbage
+    # collected; the subscription then ends by itself.
+
+    def __init__(self, subscribers, callback):
+        self._subscribers = subscribers
+        if isinstance(callback, types.MethodType):
+            self._callback = weakref.WeakMethod(callback, self._on_collected)
+            self.description = "%s.%s" % (type(callback.__self__).__qualname__, callback.__func__.__name__)
+        else:
+            self._callback = lambda: callback
+            self.description = getattr(callback, "__qualname__", repr(callback))
+
+    @property
+    def callback(self):
+        # None once cancelled or collected
+        if self._callback is None:
+            return None
+        return self._callback()
+
+    @property
+    def active(self):
+        return self.callback is not None
+
+    def cancel(self):
+        if self._callback is not None:
+            self._callback = None
+            self._subscribers._discard(self)
+
+    def cancel_on(self, widget, signal="destroy"):
+        # Ends the subscription when `widget` emits `signal`
+        widget.connect(signal, lambda *_: self.cancel())
+        return self
+
+    def _on_collected(self, reference):
+        self.cancel()
+
+
+class Subscribers:
+    # Callbacks notified in the order they subscribed. Subscriptions end
+    # with Subscription.cancel, or when the object of a subscribed method
+    # is collected.
+
+    def __init__(self):
+        self._subscriptions = []
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+    def subscribe(self, callback):
+        subscription = Subscription(self, callback)
+        self._subscriptions.append(subscription)
+        return subscription
+
+    def notify(self, *args):
+        for subscription in list(self._subscriptions):
+            callback = subscription.callback
+            if callback is not None:
+                callback(*args)
+
+    def describe(self):
+        # What is still subscribed, for debugging leaks
+        return [subscription.description for subscription in self._subscriptions]
+
+    def clear(self):
+        for subscription in list(self._subscriptions):
+            subscription.cancel()
+
+    def _discard(self, subscription):
+        try:
+            self._subscriptions.remove(subscription)
+        except ValueError:
+            pass
@@ -0,0 +1,135 @@
+import math
+import random
+from fractions import Fraction
+
+import pytest
+
+from calculator import (DECIMAL, FLOAT, FRACTION, MODES, OVERFLOW, ZERO_DIVISION, CalculationError,
+                        IncrementalEvaluator, calculate_expression, tokenize)
+from result_format import format_result
+
+# Differential checks of the parser that replaced eval: random expressions of
+# the + - * / // ** grammar against eval, and the live preview against '='.
+# The preview is compared as shown: in the decimal mode '=' gives an int for
+# integer-only expressions, the preview a Decimal of the same value.
+EXPRESSIONS = 20000
+EDITS = 3000
+SEED = 1
+
+# Characters the preview check types, deletes and types over
+EDIT_ALPHABET = list("0123456789") * 3 + list("+-*/.") * 2 + ["e5", "E-3", "//", "**2", "1.5"]
+
+
+def random_number(rng):
+    kind = rng.random()
+    if kind < 0.5:
+        return str(rng.randint(0, 999))
+    if kind < 0.8:
+        return "%d.%d" % (rng.randint(0, 99), rng.randint(0, 99))
+    if kind < 0.9:
+        return ".%d" % rng.randint(0, 99)
+    return "%de%s%d" % (rng.randint(1, 9), rng.choice(("", "+", "-")), rng.randint(0, 20))
+
+
+def random_expression(rng):
+    # Exponents are small, so that no expression takes long
+    parts = []
+    for index in range(rng.randint(1, 6)):
+        if index:
+            parts.append(rng.choice(("+", "-", "*", "/", "//")))
+        parts.append(rng.choice(("", "", "", "-", "+")))
+        parts.append(random_number(rng))
+        if rng.random() < 0.2:
+            parts.append("**" + rng.choice(("", "-")) + rng.choice(("0", "1", "2", "3", "0.5")))
+    return rng.choice(("", " ")).join(parts)
+
+
+def outcome(function, *args):
+    # (value, None), or (None, CalculationError code)
+    try:
+        return function(*args), None
+    except CalculationError as e:
+        return None, e.code
+    except ZeroDivisionError:
+        return None, ZERO_DIVISION
+    except OverflowError:
+        return None, OVERFLOW
+
+
+def same(value, expected):
+    if isinstance(expected, float) and math.isnan(expected):
+        return isinstance(value, float) and math.isnan(value)
+    return type(value) is type(expected) and value == expected
+
+
+def eval_fraction(expression):
+    # eval with every number read as a Fraction; whole results as int, as
+    # the rational mode shows them
+    code = " ".join("Fraction(%r)" % token if token[0].isdigit() or token[0] == "." else token
+                    for token in tokenize(expression))
+    value = eval(code, {"Fraction": Fraction})
+    if type(value) is Fraction and value.denominator == 1:
+        return value.numerator
+    return value
+
+
+@pytest.mark.parametrize("mode, oracle", [(FLOAT, eval), (FRACTION, eval_fraction)])
+def test_calculate_expression_matches_eval(mode, oracle):
+    rng = random.Random(SEED)
+    for _ in range(EXPRESSIONS):
+        expression = random_expression(rng)
+        value, error = outcome(calculate_expression, expression, mode)
+        expected, expected_error = outcome(oracle, expression)
+        assert error == expected_error, expression
+        assert same(value, expected), (expression, value, expected)
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_rejects_what_eval_rejects(mode):
+    for expression in ("", "+", "2+", "2**", "1..2", "*2", "2***3", "(1+2)", "2 3", "abs(1)", "1e"):
+        with pytest.raises(CalculationError):
+            calculate_expression(expression, mode)
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_preview_matches_result(mode):
+    # After every edit, anywhere in the text, a preview that does not need a
+    # full evaluation shows the result of '=' whenever '=' gives one
+    rng = random.Random(SEED)
+    for _ in range(EDITS // 10):
+        evaluator = IncrementalEvaluator(mode=mode)
+        text = ""
+        for _ in range(10):
+            position = rng.randint(0, len(text))
+            count = rng.randint(0, min(3, position)) if rng.random() < 0.4 else 0
+            inserted = "".join(rng.choice(EDIT_ALPHABET) for _ in range(rng.randint(0, 3)))
+            tail_length = len(text) - position
+            text = text[:position - count] + inserted + text[position:]
+            evaluator.replace(count, inserted, tail_length)
+            assert evaluator.text == text
+            if evaluator.needs_full_evaluation:
+                continue
+            value, error = outcome(calculate_expression, text, mode)
+            if error is None:
+                assert format_result(evaluator.preview) == format_result(value), (text, mode, evaluator.preview, value)
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_typed_preview_matches_result(mode):
+    rng = random.Random(SEED)
+    for _ in range(EDITS):
+        expression = random_expression(rng).replace(" ", "")
+        evaluator = IncrementalEvaluator(mode=mode)
+        for char in expression:
+            evaluator.push(char)
+        value, error = outcome(calculate_expression, expression, mode)
+        if evaluator.needs_full_evaluation or error is not None:
+            continue
+        assert format_result(evaluator.preview) == format_result(value), (expression, mode, evaluator.preview, value)
+
+
+def test_floor_division_floors_in_every_mode():
+    for mode in MODES:
+        assert calculate_expression("-7.5//2", mode) == -4
+        assert calculate_expression("7//-2", mode) == -4
+    assert calculate_expression("-7//2", DECIMAL) == -4
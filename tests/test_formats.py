@@ -0,0 +1,169 @@
+import math
+import struct
+from decimal import Decimal
+from fractions import Fraction
+
+import pytest
+
+from calculator import DECIMAL, FLOAT, FRACTION
+from history_export import export_history, import_history, read_columns
+from history_log import LEGACY_MAGIC, MODE_CODES, HistoryLog, decode_result, encode_result
+from history_store import HistoryEntry
+
+# Round trips of the binary history log and of both export formats: every
+# result type and mode comes back as it was written
+
+RESULTS = [
+    (0, FLOAT),
+    (-1, DECIMAL),
+    (255, FLOAT),
+    (-256, None),
+    (7 ** 6000, FRACTION),
+    (-(7 ** 6000), FRACTION),
+    (Fraction(-22, 7), FRACTION),
+    (Fraction(3 ** 700, 2 ** 900), FRACTION),
+    (0.1, FLOAT),
+    (-2.5e-300, FLOAT),
+    (math.inf, FLOAT),
+    (-math.inf, None),
+    (math.nan, FLOAT),
+    (Decimal("0.1"), DECIMAL),
+    (Decimal("-1.2345678901234567890123456789E+400"), DECIMAL),
+]
+
+
+def entries():
+    return [HistoryEntry("wyrażenie %d" % index, result, 1700000000.0 + index / 3, mode)
+            for index, (result, mode) in enumerate(RESULTS)]
+
+
+def same(value, expected):
+    if isinstance(expected, float) and math.isnan(expected):
+        return isinstance(value, float) and math.isnan(value)
+    return type(value) is type(expected) and value == expected
+
+
+def assert_entries(loaded, expected):
+    assert len(loaded) == len(expected)
+    for entry, original in zip(loaded, expected):
+        assert entry.expression == original.expression
+        assert same(entry.result, original.result), (entry, original)
+        assert entry.timestamp == original.timestamp
+        assert entry.mode == original.mode
+
+
+def assert_calculations(calculations, expected):
+    assert_entries([HistoryEntry(*calculation) for calculation in calculations], expected)
+
+
+@pytest.mark.parametrize("result", [result for result, _ in RESULTS], ids=lambda result: type(result).__name__)
+def test_encode_result_round_trip(result):
+    assert same(decode_result(encode_result(result)), result)
+
+
+def test_log_round_trip(tmp_path):
+    path = str(tmp_path / "history.log")
+    log = HistoryLog(path)
+    for entry in entries():
+        log.append(entry)
+    log.close()
+
+    log = HistoryLog(path)
+    assert_entries(log.load(len(RESULTS) + 1), entries())
+    assert_entries(log.read_last(3)[0], entries()[-3:])
+    log.close()
+
+
+def test_log_clear(tmp_path):
+    path = str(tmp_path / "history.log")
+    log = HistoryLog(path)
+    for entry in entries():
+        log.append(entry)
+    log.clear()
+    log.append(entries()[0])
+    log.close()
+
+    log = HistoryLog(path)
+    assert_entries(log.load(10), entries()[:1])
+    log.close()
+
+
+def test_log_drops_torn_record(tmp_path):
+    path = str(tmp_path / "history.log")
+    log = HistoryLog(path)
+    for entry in entries():
+        log.append(entry)
+    log.close()
+    with open(path, "r+b") as log_file:
+        log_file.truncate(log_file.seek(0, 2) - 3)
+
+    log = HistoryLog(path)
+    assert_entries(log.load(len(RESULTS)), entries()[:-1])
+    log.append(entries()[-1])
+    log.close()
+    log = HistoryLog(path)
+    assert_entries(log.load(len(RESULTS)), entries())
+    log.close()
+
+
+def test_log_upgrades_legacy_format(tmp_path):
+    # Records of the first format have no mode and hold exact_repr() text;
+    # the torn one at the end is dropped
+    header = struct.Struct("<dII")
+    trailer = struct.Struct("<I")
+    records = [("1/3", "Fraction(1, 3)", 1.0), ("2**100", repr(2 ** 100), 2.0),
+               ("0.1+0.2", "0.30000000000000004", 3.0)]
+    data = LEGACY_MAGIC
+    for expression, result, timestamp in records:
+        expression, result = expression.encode("utf-8"), result.encode("utf-8")
+        length = header.size + len(expression) + len(result) + trailer.size
+        data += header.pack(timestamp, len(expression), len(result)) + expression + result + trailer.pack(length)
+    path = tmp_path / "history.log"
+    path.write_bytes(data + header.pack(4.0, 1, 1)[:7])
+
+    log = HistoryLog(str(path))
+    expected = [HistoryEntry("1/3", Fraction(1, 3), 1.0), HistoryEntry("2**100", 2 ** 100, 2.0),
+                HistoryEntry("0.1+0.2", 0.1 + 0.2, 3.0)]
+    assert_entries(log.load(10), expected)
+    log.close()
+
+
+def test_log_rejects_other_files(tmp_path):
+    path = tmp_path / "history.log"
+    path.write_bytes(b"not a history log")
+    with pytest.raises(ValueError):
+        HistoryLog(str(path))
+
+
+@pytest.mark.parametrize("name", ["history.csv", "history.calc"])
+def test_export_round_trip(tmp_path, name):
+    path = str(tmp_path / name)
+    export_history(entries(), path)
+    assert_calculations(list(import_history(path)), entries())
+
+
+def test_export_last(tmp_path):
+    path = str(tmp_path / "history.calc")
+    export_history(entries(), path)
+    assert_calculations(list(import_history(path, last=4)), entries()[-4:])
+    assert_calculations(list(import_history(path, last=len(RESULTS) + 5)), entries())
+    assert list(import_history(path, last=0)) == []
+
+
+@pytest.mark.parametrize("name", ["history.csv", "history.calc"])
+def test_export_empty(tmp_path, name):
+    path = str(tmp_path / name)
+    export_history([], path)
+    assert list(import_history(path)) == []
+
+
+def test_columns_match_entries(tmp_path):
+    path = str(tmp_path / "history.calc")
+    export_history(entries(), path)
+    columns = read_columns(path)
+    assert list(columns["timestamp"]) == [entry.timestamp for entry in entries()]
+    assert list(columns["mode"]) == [MODE_CODES[entry.mode] for entry in entries()]
+    expression_end = [int(end) for end in columns["expression_end"]]
+    starts = [0] + expression_end[:-1]
+    assert [bytes(columns["expression_bytes"][start:end]).decode("utf-8")
+            for start, end in zip(starts, expression_end)] == [entry.expression for entry in entries()]